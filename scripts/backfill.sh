@@ -1,13 +1,11 @@
 #!/bin/bash
 
+# search_filings splits wide date ranges on its own, so the whole range can
+# go to a single pupa process
 the_date=$1
-last_date=$(date --date "$2 1 day" +"%Y-%m-%d")
+last_date=$2
 
 echo $the_date
 echo $last_date
 
-until [ "$the_date" == "$last_date" ]
-do
-    pupa --loglevel ERROR update unitedstates lobbying_registrations start_date=$the_date end_date=$the_date --fastmode;
-    the_date=$(date --date "$the_date 1 day" +"%Y-%m-%d");
-done
+pupa --loglevel ERROR update unitedstates lobbying_registrations start_date=$the_date end_date=$last_date --fastmode;
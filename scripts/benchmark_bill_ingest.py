@@ -0,0 +1,150 @@
+"""
+Time finding and reading a synthetic unitedstates/congress bill tree with
+the bill scraper's index and reader.
+
+Discovery is timed walking the tree with os.walk and a regex, and with the
+BillIndex from cold and then warm. Reading is timed serially with the
+standard json module, serially with the faster decoder if one is installed,
+and on a pool of worker processes:
+
+    python scripts/benchmark_bill_ingest.py [bills] [workers]
+
+Every reading mode has to produce the same records in the same order.
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import logging
+import tempfile
+
+from os import path
+
+logger = logging.getLogger("")
+
+BILL_TYPES = ['hr', 'hres', 'hconres', 'hjres', 's', 'sres', 'sconres',
+              'sjres']
+VERSION_CODES = ['ih', 'rh', 'eh', 'is', 'rs', 'es', 'enr']
+
+
+def synthetic_bill(rnd, congress, bill_type, number):
+    person = lambda i: {'name': 'Member {}'.format(i),
+                        'thomas_id': '{:05d}'.format(i),
+                        'title': rnd.choice(['Rep', 'Sen'])}
+    return {
+        'bill_id': '{}{}-{}'.format(bill_type, number, congress),
+        'bill_type': bill_type,
+        'number': str(number),
+        'congress': str(congress),
+        'official_title': 'To do the thing numbered {}.'.format(number),
+        'subjects': ['Subject {}'.format(rnd.randint(0, 300))
+                     for _ in range(rnd.randint(1, 20))],
+        'summary': {'as': 'Introduced in House', 'date': '2015-01-06',
+                    'text': 'Summary text. ' * rnd.randint(10, 200)},
+        'url': 'https://www.congress.gov/bill/{}/{}'.format(congress,
+                                                           number),
+        'titles': [{'type': 'short', 'title': 'Title {}'.format(i)}
+                   for i in range(rnd.randint(1, 6))],
+        'related_bills': [{'session': str(congress),
+                           'name': 'hr{}'.format(rnd.randint(1, 5000))}
+                          for _ in range(rnd.randint(0, 4))],
+        'sponsor': person(rnd.randint(1, 600)),
+        'cosponsors': [person(rnd.randint(1, 600))
+                       for _ in range(rnd.randint(0, 60))],
+        'introduced_at': '2015-01-06',
+        'actions': [{'acted_at': '2015-01-{:02d}'.format(i % 28 + 1),
+                     'type': 'referral', 'text': 'Action {}.'.format(i)}
+                    for i in range(rnd.randint(1, 30))],
+    }
+
+
+def write_tree(root, bills, congress=114):
+    rnd = random.Random(0)
+    for i in range(bills):
+        bill_type = BILL_TYPES[i % len(BILL_TYPES)]
+        bill_dir = path.join(root, 'data', str(congress), 'bills', bill_type,
+                             '{}{}'.format(bill_type, i))
+        os.makedirs(bill_dir)
+        with open(path.join(bill_dir, 'data.json'), 'w') as f:
+            json.dump(synthetic_bill(rnd, congress, bill_type, i), f)
+        for code in rnd.sample(VERSION_CODES, rnd.randint(0, 3)):
+            version_dir = path.join(bill_dir, 'text-versions', code)
+            os.makedirs(version_dir)
+            with open(path.join(version_dir, 'data.json'), 'w') as f:
+                json.dump({'version_code': code, 'issued_on': '2015-01-06',
+                           'urls': {'pdf': 'https://example.com/a.pdf',
+                                    'xml': 'https://example.com/a.xml'}},
+                          f)
+
+
+def walk_tree(root):
+    # how bill files used to be found
+    pattern = r'.*[a-z]*\/[a-z]*[0-9]*\/data\.json'
+    for dirpath, dirs, files in os.walk(root):
+        for basename in files:
+            filename = os.path.join(dirpath, basename)
+            if re.match(pattern, filename):
+                yield filename
+
+
+def timed(name, func, *args):
+    start = time.time()
+    result = func(*args)
+    logger.info('{m:>16}: {s:.2f}s'.format(m=name, s=time.time() - start))
+    return result
+
+
+def main(bills=20000, workers=None):
+    from unitedstates import bill
+    from unitedstates.bill_index import BillIndex
+
+    workers = int(workers) if workers is not None else None
+    fast_loads = bill.json_loads
+
+    with tempfile.TemporaryDirectory() as root:
+        write_tree(root, int(bills))
+
+        timed('os.walk + regex', lambda: list(walk_tree(root)))
+        index = BillIndex(os.path.join(root, 'bill_index.sqlite3'), root)
+        # back date the tree so every listing can be kept
+        for dirpath, dirs, files in os.walk(os.path.join(root, 'data')):
+            os.utime(dirpath, (time.time() - 60, time.time() - 60))
+        timed('index, cold', index.update)
+        indexed = timed('index, warm', index.update)
+        logger.info('{n} bills indexed, {l} directories listed on the warm '
+                    'run'.format(n=len(indexed), l=index.listed))
+
+        bill_files = [indexed[key]
+                      for key in sorted(indexed, key=BillIndex.sort_key)]
+
+        modes = [('serial, json', json.loads, 0)]
+        if fast_loads is not json.loads:
+            modes.append(('serial, {}'.format(fast_loads.__module__),
+                          fast_loads, 0))
+        modes.append(('{} workers'.format(workers or os.cpu_count()),
+                      fast_loads, workers))
+
+        baseline = None
+        for name, loads, mode_workers in modes:
+            bill.json_loads = loads
+            start = time.time()
+            records = list(bill.read_bills(bill_files, workers=mode_workers))
+            elapsed = time.time() - start
+            logger.info('{m:>16}: {s:.2f}s, {r:.0f} bills/s'.format(
+                m=name, s=elapsed, r=len(records) / elapsed))
+
+            if baseline is None:
+                baseline = records
+            elif records != baseline:
+                logger.error('{m} read different records'.format(m=name))
+                sys.exit(1)
+
+        bill.json_loads = fast_loads
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+    main(*sys.argv[1:])
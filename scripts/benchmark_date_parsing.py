@@ -0,0 +1,102 @@
+"""
+Time data_munge's date parsing over the date strings found in cached
+filings, against the strptime loop it used to be:
+
+    python scripts/benchmark_date_parsing.py [cache dir] [repeat]
+
+Every text node of the cached .html and .xml filings that looks like a date
+is collected, in document order, so strings repeat as often as they do in
+real filings. Without any cached filings a synthetic mix is used. Both ways
+have to give the same result for every string.
+"""
+import os
+import re
+import sys
+import time
+import random
+import logging
+
+from datetime import datetime, timedelta
+from os import path
+
+logger = logging.getLogger("")
+
+DATE_LIKE = re.compile(r'^\s*[0-9]{1,4}[/.-][0-9]{1,2}[/.-][0-9]{2,4}'
+                       r'(\s+[0-9:]+\s*[AaPp][Mm])?\s*$')
+
+
+def cached_date_strings(cache_dir, limit=200000):
+    from lxml import etree
+
+    strings = []
+    for dirpath, dirs, files in os.walk(cache_dir):
+        for basename in sorted(files):
+            if not basename.endswith(('.html', '.xml')):
+                continue
+            try:
+                tree = etree.parse(path.join(dirpath, basename),
+                                   etree.HTMLParser())
+            except (OSError, etree.LxmlError):
+                continue
+            for text in tree.xpath('//text()'):
+                if DATE_LIKE.match(text):
+                    strings.append(text.strip())
+            if len(strings) >= limit:
+                return strings
+    return strings
+
+
+def synthetic_date_strings(count=200000):
+    from unitedstates.form_parsing.utils.data_munge import DATE_FORMATS
+
+    rnd = random.Random(0)
+    # filings mostly share a few hundred dates
+    days = [datetime(2008, 1, 1) + timedelta(days=rnd.randint(0, 3000),
+                                             seconds=rnd.randint(0, 86399))
+            for _ in range(500)]
+    weights = [1.0 / (i + 1) for i in range(len(days))]
+    return [rnd.choices(days, weights)[0].strftime(
+            rnd.choice(DATE_FORMATS)) for _ in range(count)]
+
+
+def timed(name, func, strings, repeat):
+    start = time.time()
+    for _ in range(repeat):
+        results = [func(s) for s in strings]
+    elapsed = time.time() - start
+    logger.info('{m:>30}: {s:.2f}s, {r:.0f} strings/s'.format(
+        m=name, s=elapsed, r=len(strings) * repeat / elapsed))
+    return results
+
+
+def main(cache_dir=None, repeat=3):
+    from unitedstates.form_parsing.utils import data_munge
+
+    strings = cached_date_strings(cache_dir) if cache_dir else []
+    if strings:
+        logger.info('{n} date strings from {d}'.format(n=len(strings),
+                                                       d=cache_dir))
+    else:
+        strings = synthetic_date_strings()
+        logger.info('{n} synthetic date strings'.format(n=len(strings)))
+    logger.info('{n} distinct'.format(n=len(set(strings))))
+
+    repeat = int(repeat)
+    for kind in ('date', 'datetime'):
+        baseline = timed('strptime_' + kind,
+                         getattr(data_munge, 'strptime_' + kind),
+                         strings, repeat)
+        engine = getattr(data_munge, kind + '_from_string')
+        uncached = engine.__wrapped__
+        for name, func in ((engine.__name__ + ', no cache', uncached),
+                           (engine.__name__, engine)):
+            if timed(name, func, strings, repeat) != baseline:
+                logger.error('{m} gave different results'.format(m=name))
+                sys.exit(1)
+    logger.info('results identical')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+    main(*sys.argv[1:])
@@ -0,0 +1,75 @@
+"""
+Time data_munge.us_number against locale.atof under en_US, which
+parse_decimal used to go through, on a synthetic mix of US formatted
+amounts:
+
+    python scripts/benchmark_decimal_parsing.py [amounts] [repeat]
+
+On hosts without the en_US.UTF-8 locale atof is timed in the current
+locale instead, on the same amounts with their thousands separators
+already removed, which is all en_US adds. Both have to give the same value
+for every amount atof accepts.
+"""
+import sys
+import time
+import random
+import locale
+import logging
+
+from os import path
+
+logger = logging.getLogger("")
+
+
+def synthetic_amounts(count):
+    rnd = random.Random(0)
+    amounts = []
+    for _ in range(count):
+        value = rnd.choice([rnd.randint(0, 999), rnd.randint(0, 10 ** 7),
+                            rnd.randint(0, 10 ** 7) / 100.0])
+        amounts.append(rnd.choice(['{:,}', '{:,.2f}', '{}', '{:.2f}'])
+                       .format(value))
+    return amounts
+
+
+def timed(name, func, amounts, repeat):
+    start = time.time()
+    for _ in range(repeat):
+        results = [func(s) for s in amounts]
+    elapsed = time.time() - start
+    logger.info('{m:>20}: {s:.2f}s, {r:.0f} amounts/s'.format(
+        m=name, s=elapsed, r=len(amounts) * repeat / elapsed))
+    return results
+
+
+def main(count=200000, repeat=3):
+    from unitedstates.form_parsing.utils.data_munge import us_number
+
+    amounts = synthetic_amounts(int(count))
+    repeat = int(repeat)
+
+    try:
+        locale.setlocale(locale.LC_NUMERIC, 'en_US.UTF-8')
+        atof_amounts = amounts
+        atof_name = 'locale.atof, en_US'
+    except locale.Error:
+        logger.warning('en_US.UTF-8 is not available, timing atof in the '
+                       'current locale without thousands separators')
+        atof_amounts = [s.replace(',', '') for s in amounts]
+        atof_name = 'locale.atof'
+
+    baseline = timed(atof_name, locale.atof, atof_amounts, repeat)
+    if timed('us_number', us_number, amounts, repeat) != baseline:
+        logger.error('us_number gave different values')
+        sys.exit(1)
+
+    extras = ['$1,234.50', '(1,234.50)', '-$5', '12.5%', '($0.75)']
+    for s in extras:
+        logger.info('{s:>20} -> {v}'.format(s=s, v=us_number(s)))
+    logger.info('values identical')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+    main(*sys.argv[1:])
@@ -0,0 +1,104 @@
+"""
+Compare the tree and streaming engines of the post-employment XML parsers
+on a synthetic file, reporting time and peak memory for each:
+
+    python scripts/benchmark_xml_streaming.py [records] [house|senate]
+
+Each engine runs in its own process so their peak RSS doesn't mix, and the
+forms they produce are hashed to check the output is identical.
+"""
+import sys
+import json
+import time
+import hashlib
+import logging
+import resource
+import tempfile
+import subprocess
+
+from os import path
+
+logger = logging.getLogger("")
+
+HOUSE_RECORD = ('<Employee><EmployeeName>Employee {i}</EmployeeName>'
+                '<OfficeName>Office of Representative {o}</OfficeName>'
+                '<TerminationDate>0{m}/1{d}/2015</TerminationDate>'
+                '<LobbyingEligibilityDate>0{m}/1{d}/2016'
+                '</LobbyingEligibilityDate></Employee>\n')
+
+SENATE_RECORD = ('<previous_employee><name><first>First{i}</first>'
+                 '<middle>M</middle><last>Last{i}</last></name>'
+                 '<office_name>Office of Senator {o}</office_name>'
+                 '<restriction_period><begin_date>0{m}/1{d}/2015</begin_date>'
+                 '<end_date>0{m}/1{d}/2016</end_date></restriction_period>'
+                 '</previous_employee>\n')
+
+DOCUMENTS = {
+    'house': ('PostEmployment', HOUSE_RECORD),
+    'senate': ('post_employment_lobbying_restrictions', SENATE_RECORD),
+}
+
+
+def write_synthetic(filename, kind, records):
+    root_tag, record = DOCUMENTS[kind]
+    with open(filename, 'w') as f:
+        f.write('<{}>\n'.format(root_tag))
+        for i in range(records):
+            f.write(record.format(i=i, o=i % 500, m=i % 9 + 1, d=i % 9))
+        f.write('</{}>\n'.format(root_tag))
+
+
+def run_engine(kind, engine, filename):
+    from unitedstates.form_parsing import (
+        UnitedStatesHousePostEmploymentParser,
+        UnitedStatesSenatePostEmploymentParser)
+
+    parser_class = {'house': UnitedStatesHousePostEmploymentParser,
+                    'senate': UnitedStatesSenatePostEmploymentParser}[kind]
+    parser_class.streaming = engine == 'stream'
+    parser = parser_class(None, tempfile.gettempdir())
+
+    digest = hashlib.sha1()
+    count = 0
+    start = time.time()
+    for form in parser.parse(root=filename):
+        digest.update(json.dumps(form.as_dict(), sort_keys=True).encode())
+        count += 1
+    elapsed = time.time() - start
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({'forms': count, 'seconds': elapsed,
+                      'peak_rss_mb': peak / 1024.0,
+                      'sha1': digest.hexdigest()}))
+
+
+def main(records=500000, kind='house'):
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = path.join(tmp, '{}.xml'.format(kind))
+        write_synthetic(filename, kind, int(records))
+        logger.info('{k}: {n} records, {s:.1f}MB'.format(
+            k=kind, n=records, s=path.getsize(filename) / 1048576.0))
+
+        results = {}
+        for engine in ('tree', 'stream'):
+            out = subprocess.check_output([sys.executable, __file__, '--run',
+                                           kind, engine, filename])
+            results[engine] = json.loads(out.decode().splitlines()[-1])
+            logger.info('{e:>6}: {forms} forms in {seconds:.2f}s, peak RSS '
+                        '{peak_rss_mb:.0f}MB'.format(e=engine,
+                                                      **results[engine]))
+
+        if results['tree']['sha1'] != results['stream']['sha1']:
+            logger.error('engines produced different output')
+            sys.exit(1)
+        logger.info('output identical')
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+    if sys.argv[1:2] == ['--run']:
+        logging.getLogger('parser').setLevel(logging.WARNING)
+        run_engine(*sys.argv[2:])
+    else:
+        main(*sys.argv[1:])
@@ -0,0 +1,118 @@
+"""
+Time loading a congress-legislators style YAML file with yaml.safe_load,
+with the libyaml CSafeLoader, and from the pickle load_yaml keeps of it:
+
+    python scripts/benchmark_yaml_loading.py [people | path/to/file.yaml]
+
+Without a file a synthetic one shaped like legislators-historical.yaml is
+written. Every loader has to produce the same data.
+"""
+import sys
+import time
+import random
+import logging
+import tempfile
+
+from os import path
+
+import yaml
+
+logger = logging.getLogger("")
+
+PERSON = '''- id:
+    bioguide: B{i:06d}
+    thomas: '{i:05d}'
+    govtrack: {i}
+    icpsr: {i}
+    wikipedia: Member {i}
+    fec:
+    - H{i:08d}
+  name:
+    first: First{i}
+    last: Last{i}
+    official_full: First{i} Last{i}
+  bio:
+    birthday: 19{y:02d}-0{m}-1{d}
+    gender: {g}
+'''
+
+TERM = '''  - type: {t}
+    start: {year}-01-03
+    end: {end}-01-03
+    state: {s}
+    district: {district}
+    party: {party}
+'''
+
+STATES = ['AL', 'AK', 'AZ', 'CA', 'CO', 'NY', 'TX', 'VA', 'WA', 'WY']
+
+
+def write_synthetic(filename, people):
+    rnd = random.Random(0)
+    with open(filename, 'w') as f:
+        for i in range(people):
+            f.write(PERSON.format(i=i, y=i % 90 + 10, m=i % 9 + 1, d=i % 9,
+                                  g=rnd.choice('MF')))
+            f.write('  terms:\n')
+            year = rnd.randint(1789, 2015)
+            for _ in range(rnd.randint(1, 8)):
+                f.write(TERM.format(t=rnd.choice(['rep', 'sen']), year=year,
+                                    end=year + 2, s=rnd.choice(STATES),
+                                    district=rnd.randint(0, 50),
+                                    party=rnd.choice(['Democrat',
+                                                      'Republican',
+                                                      'Whig'])))
+                year += 2
+
+
+def timed(name, func, *args):
+    start = time.time()
+    result = func(*args)
+    logger.info('{m:>16}: {s:.2f}s'.format(m=name, s=time.time() - start))
+    return result
+
+
+def main(source='12000'):
+    from unitedstates.cache import load_yaml
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if path.isfile(source):
+            filename = source
+        else:
+            filename = path.join(tmp, 'legislators-synthetic.yaml')
+            write_synthetic(filename, int(source))
+        logger.info('{f}: {s:.1f}MB'.format(
+            f=path.basename(filename), s=path.getsize(filename) / 1048576.0))
+
+        def safe_load():
+            with open(filename, 'rb') as f:
+                return yaml.safe_load(f)
+
+        def c_safe_load():
+            with open(filename, 'rb') as f:
+                return yaml.load(f, Loader=yaml.CSafeLoader)
+
+        cache_dir = path.join(tmp, 'yaml')
+        baseline = timed('yaml.safe_load', safe_load)
+        results = [('load_yaml, cold', timed('load_yaml, cold', load_yaml,
+                                             filename, cache_dir)),
+                   ('load_yaml, warm', timed('load_yaml, warm', load_yaml,
+                                             filename, cache_dir))]
+        if getattr(yaml, '__with_libyaml__', False):
+            results.append(('CSafeLoader', timed('CSafeLoader',
+                                                 c_safe_load)))
+        else:
+            logger.warning('libyaml is not available, load_yaml falls back '
+                           'to the pure Python loader')
+
+        for name, data in results:
+            if data != baseline:
+                logger.error('{m} loaded different data'.format(m=name))
+                sys.exit(1)
+        logger.info('{n} records, all loaders agree'.format(n=len(baseline)))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    sys.path.insert(0, path.dirname(path.dirname(path.abspath(__file__))))
+    main(*sys.argv[1:])
@@ -1,4 +1,5 @@
 import os
+import importlib.util
 import subprocess
 import time
 import shutil
@@ -6,13 +7,26 @@ import json
 from copy import deepcopy
 import logging
 
-import requests
-
 os.environ['DJANGO_SETTINGS_MODULE'] = 'pupa.settings'
 
 from django.conf import settings
 
 
+def load_sessions_module():
+    # loaded from its file so the unitedstates package, and every scraper
+    # and pupa.scrape with it, isn't imported just for a session
+    filename = os.path.join(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))), 'unitedstates', 'sessions.py')
+    spec = importlib.util.spec_from_file_location('unitedstates_sessions',
+                                                  filename)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+pooled_session = load_sessions_module().pooled_session
+
+
 DEDUPE_BIN = os.path.join(settings.BIN_DIR,
                           'echelon-0.1.0-SNAPSHOT-standalone.jar')
 
@@ -22,12 +36,14 @@ logging.getLogger("requests").setLevel(logging.WARNING)
 
 logger = logging.getLogger("")
 
+session = pooled_session()
+
 def get_whole_list(endpoint):
     params = {'apikey': settings.API_KEY, 'page': 1}
     max_page = 999999
     while params['page'] <= max_page:
         _url = '/'.join([API_URL, endpoint])
-        resp = requests.get(_url, params=params)
+        resp = session.get(_url, params=params)
         jd = resp.json()
         max_page = jd['meta']['max_page']
         for result in jd['results']:
@@ -41,7 +57,7 @@ def get_whole_list(endpoint):
 def get_entity(entity_id):
     params = {'apikey': settings.API_KEY}
     target_url = "{a}/{e}/".format(a=API_URL, e=entity_id)
-    resp = requests.get(target_url, params=params)
+    resp = session.get(target_url, params=params)
     jd = resp.json()
     return jd
 
@@ -109,6 +125,9 @@ def main():
 
         export_data(person_file, people)
 
+    for line in session.host_stats.summary():
+        logger.info(line)
+
     logger.info('deduping...')
     exit_status = subprocess.call(['java',
                                    '-jar', DEDUPE_BIN,
@@ -0,0 +1,89 @@
+"""
+Local stand-in for soprweb.senate.gov, serving LD-1 filings from a cache dir.
+
+Answers the two requests the lobbying scraper makes:
+
+ - POST index.cfm (event=processSearchCriteria) with a search results table
+   listing every cached filing
+ - GET index.cfm?event=getFilingDetails&filingID=... with the cached HTML
+
+so a full scrape can be run and timed without touching the real site:
+
+    python scripts/serve_cached_filings.py _cache 8000
+    pupa update unitedstates lobbying_registrations \\
+        base_url=http://127.0.0.1:8000/index.cfm
+"""
+import os
+import sys
+import time
+import logging
+
+from glob import glob
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, parse_qsl
+
+logger = logging.getLogger("")
+
+ROW_TEMPLATE = ('<tr onclick="window.open(\'index.cfm?event=getFilingDetails'
+                '&amp;filingID={id}\')"><td>{id}</td><td>client {id}</td>'
+                '<td>{type}</td><td></td><td>{date}</td></tr>')
+
+
+class CachedFilingHandler(BaseHTTPRequestHandler):
+    # keep connections open like the real site does; without TCP_NODELAY
+    # the separate header and body writes stall on delayed ACKs
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    cache_dir = '.'
+    latency = 0
+
+    def send_body(self, body, status=200):
+        time.sleep(self.latency)
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        params = parse_qs(urlparse(self.path).query)
+        filing_id = params.get('filingID', [''])[0]
+        path = os.path.join(self.cache_dir,
+                            '{}.html'.format(os.path.basename(filing_id)))
+        if not filing_id or not os.path.exists(path):
+            self.send_body(b'not found', status=404)
+            return
+        with open(path, 'rb') as f:
+            self.send_body(f.read())
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        form = dict(parse_qsl(self.rfile.read(length).decode('utf-8')))
+        filing_ids = sorted(os.path.splitext(os.path.basename(p))[0]
+                            for p in glob(os.path.join(self.cache_dir,
+                                                       '*.html')))
+        rows = [ROW_TEMPLATE.format(id=escape(i),
+                                    type=escape(form.get('reportType', '')),
+                                    date=escape(form.get('datePostedStart',
+                                                         '')))
+                for i in filing_ids]
+        body = ('<html><body><table id="searchResults"><tbody>{}'
+                '</tbody></table></body></html>').format(''.join(rows))
+        self.send_body(body.encode('utf-8'))
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+
+def main(cache_dir, port=8000, latency=0):
+    CachedFilingHandler.cache_dir = cache_dir
+    CachedFilingHandler.latency = float(latency)
+    server = ThreadingHTTPServer(('127.0.0.1', int(port)), CachedFilingHandler)
+    logger.info('serving {d} on port {p}'.format(d=cache_dir, p=port))
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main(*sys.argv[1:])
@@ -0,0 +1,51 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from datetime import date, datetime, timedelta
+from unittest import mock
+
+from unitedstates.disclosures import (
+    UnitedStatesLobbyingRegistrationDisclosureScraper)
+
+
+class LobbyingCheckpointTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.windows = []
+
+    def scraper(self):
+        scraper = UnitedStatesLobbyingRegistrationDisclosureScraper(
+            mock.Mock(), os.path.join(self.tmp, 'data'))
+        scraper.state_db = os.path.join(self.tmp, 'state.sqlite3')
+        scraper.parse_dir = os.path.join(self.tmp, 'parsed')
+        scraper.filing_types = scraper.filing_types[:1]
+        scraper.search_window = self.search_window
+        return scraper
+
+    def search_window(self, filing_type, start_date, end_date):
+        self.windows.append((start_date, end_date))
+        return []
+
+    def test_default_runs_resume_from_the_mark(self):
+        today = datetime.combine(date.today(), datetime.min.time())
+        yesterday = today - timedelta(days=1)
+
+        self.assertEqual(list(self.scraper().scrape(parse_workers=0)), [])
+        self.assertEqual(self.windows, [(yesterday, today)])
+        scraper = self.scraper()
+        list(scraper.scrape(parse_workers=0))
+        self.assertEqual(scraper.checkpoint.high_water_mark(
+            [ft['code'] for ft in scraper.filing_types]),
+            yesterday.strftime('%Y-%m-%d'))
+
+        # the second run starts the day after the mark the first one left
+        self.assertEqual(scraper.start_date, today)
+        self.assertEqual(self.windows[1:], [(today, today)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,21 +1,146 @@
 from pupa.scrape import Scraper, Person, Membership, Organization, Post, Bill
 from pupa import settings
 
-import subprocess
 import os
-import re
 import json
+import datetime
 import dateutil.parser
 
-def find_files(directory, pattern):
-    for root, dirs, files in os.walk(directory):
-        for basename in files:
-            filename = os.path.join(root, basename)
-            if re.match(pattern, filename):
-                yield filename
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from .bill_index import BillIndex, BillManifest
+from .congress_runner import CongressRunner, parse_congresses
+from .cache import truthy
+
+# bulk loads spend much of their time decoding JSON, so use a faster decoder
+# when one is installed; all of them accept bytes
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    try:
+        from ujson import loads as json_loads
+    except ImportError:
+        json_loads = json.loads
+
+def load_json(filename):
+    with open(filename, 'rb') as json_file:
+        return json_loads(json_file.read())
+
+def read_bill(bill_files):
+    """
+    Reads a bill's data.json and its text versions, as found by the BillIndex, into the
+    arguments for building a Bill. Module level so it can run in worker processes.
+
+    @return: dict of bill data, or None if the bill couldn't be read
+    """
+    type_map = UnitedStatesBillScraper.TYPE_MAP
+    version_map = UnitedStatesBillScraper.VERSION_MAP
+
+    try:
+        json_data = load_json(bill_files.data)
+    except (IOError, ValueError):
+        return None
+
+    chamber = type_map[json_data['bill_type']]['chamber']
+
+    record = {
+        'identifier': type_map[json_data['bill_type']]['canonical'] + ' ' + json_data['number'],
+        'legislative_session': json_data['congress'],
+        'title': json_data['official_title'],
+        'chamber': chamber,
+        'type': [json_data['bill_type']],
+        'subject': json_data['subjects'],
+        'summary': (json_data['summary']['as'],
+                    json_data['summary']['text'],
+                    json_data['summary']['date']),
+        'sources': [{'url': json_data['url'], 'note': 'all'}],
+        'other_titles': [{'note': t['type'], 'title': t['title']} for t in json_data['titles']],
+        # change value of relationship_type to 'type' field from json_data when permitted by schema
+        'related_bills': [{'session': b['session'], 'name': b['name'], 'relationship_type':'companion'}
+                          for b in json_data['related_bills']],
+        # (name, primary, thomas_id)
+        'sponsors': [(json_data['sponsor']['name'], True, json_data['sponsor']['thomas_id'])] +
+                    [(cs['name'], False, cs['thomas_id']) for cs in json_data['cosponsors']],
+        'actions': [],
+        'versions': [],
+        'unreadable': [],
+    }
+
+    # add introduced_at and actions
+    record['actions'].append({'date': json_data['introduced_at'], 'type': 'introduced',
+                              'description': 'date of introduction',
+                              'actor': chamber,
+                              'related_entities': []})
+    for action in json_data['actions']:
+        record['actions'].append({'date': action['acted_at'],
+                                  'type': [action['type']],
+                                  'description': action['text'],
+                                  'actor': chamber,
+                                  'related_entities': []
+                                  })
+
+    # add bill versions
+    for version_path in bill_files.versions:
+        try:
+            version_json_data = load_json(version_path)
+        except (IOError, ValueError):
+            record['unreadable'].append(version_path)
+            continue
+        for k, v in version_json_data['urls'].items():
+            record['versions'].append({'date': version_json_data['issued_on'],
+                                       'type': version_json_data['version_code'],
+                                       'name': version_map[version_json_data['version_code']],
+                                       'links': [{'mimetype': k, 'url': v}]})
+
+    return record
+
+def read_bill_batch(batch):
+    return [read_bill(bill_files) for bill_files in batch]
+
+def read_bills(bills, workers=None, chunksize=64):
+    """
+    Reads bills (BillFiles) on a pool of worker processes (one per CPU if workers is None,
+    or in this process if it's 0), yielding (bill_files, record) pairs in the same order.
+    Only a few batches of chunksize bills per worker are in flight at a time.
+    """
+    if workers == 0:
+        for bill_files in bills:
+            yield bill_files, read_bill(bill_files)
+        return
+
+    bills = iter(bills)
+    batches = iter(lambda: list(islice(bills, chunksize)), [])
+    max_pending = 2 * (workers or os.cpu_count() or 1)
+    pending = deque()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for batch in batches:
+            pending.append((batch, pool.submit(read_bill_batch, batch)))
+            if len(pending) >= max_pending:
+                batch, future = pending.popleft()
+                yield from zip(batch, future.result())
+        while pending:
+            batch, future = pending.popleft()
+            yield from zip(batch, future.result())
 
 class UnitedStatesBillScraper(Scraper):
 
+    # bill files handed to each worker process at a time
+    chunksize = 64
+
+    bill_index_db = os.path.join(settings.CACHE_DIR, 'bill_index.sqlite3')
+    bill_tombstones = os.path.join(settings.CACHE_DIR, 'bill_tombstones.jsonl')
+
+    # only scrape bills that changed since the last run
+    incremental = False
+    # bills noted in the manifest at a time
+    manifest_batch = 500
+
+    # upstream scraper tasks run at once
+    upstream_workers = 4
+
     # https://github.com/unitedstates/congress/wiki/bills#basic-information
     TYPE_MAP = {
          # "H.R. 1234". It stands for House of Representatives, but it is the prefix used for bills introduced in the House.
@@ -97,117 +222,197 @@ class UnitedStatesBillScraper(Scraper):
         'rdh': 'Received in House'
     }
 
-    def run_unitedstates_bill_scraper(self):
+    def run_unitedstates_bill_scraper(self, congresses=None):
         """
-        Runs the unitedstates scrapers using the virtualenv and data path set in UnitedStates.
+        Starts the unitedstates scrapers using the virtualenv and data path set in UnitedStates.
         Must set environmental variables for the python virtualenv that you are using and the
         path for the unitedstates/congress project
 
-        @return: void
+        The scrapers run concurrently in the background, as one task per scraper, or per
+        scraper and congress if congresses (e.g. '113-114') are given.
+
+        @return: the started CongressRunner, or None if the environment isn't set up
         """
         try:
             us_congress_path = os.environ['US_CONGRESS_PATH']
-            if not us_congress_path.endswith('/'): us_congress_path += '/'
             us_virtenv_python_bin_path = os.environ['US_VIRTENV_PYTHON_BIN_PATH']
-            commands = [
-                [us_virtenv_python_bin_path, us_congress_path + 'run', 'bills'],
-                [us_virtenv_python_bin_path, us_congress_path + 'run', 'bill_versions']
-            ]
-            for cmd in commands:
-                process = subprocess.Popen(cmd, cwd=settings.SCRAPED_DATA_DIR)
-                process.wait()
-            return
         except KeyError:
             print('You must set environmental variables for the unitedstates/congress path (US_CONGRESS_PATH)'
                   'and the virtualenv python bin path (US_VIRTENV_PYTHON_BIN_PATH) for that project.')
+            return None
 
-    def scrape_bills(self):
+        runner = CongressRunner(us_virtenv_python_bin_path, us_congress_path,
+                                settings.SCRAPED_DATA_DIR,
+                                congresses=parse_congresses(congresses),
+                                max_workers=self.upstream_workers)
+        runner.start()
+        return runner
+
+    def scrape_bills(self, workers=None, incremental=False, congresses=None):
         """
         Does the following
 
-        1) Scrapes bill data from unitedstates project and saves the data to path specified in UnitedStates module
-        2) Iterates over bill data and converts each one to an OCD-compliant bill model.
+        1) Starts scraping bill data from unitedstates project, saving the data to path specified in UnitedStates module
+        2) As soon as the last upstream task covering a congress exits, finds that congress's bill files through the
+           BillIndex, then reads the bill data on a pool of worker processes (workers, one per CPU by default, 0 for
+           none) and converts each one to an OCD-compliant bill model, in a stable order. Once every task has exited
+           the whole tree is gone over once more for anything not converted yet, so each bill is converted once,
+           from its finished files.
         3) Yields the OCD-compliant bill model instance
+        In incremental mode only bills whose data.json or text versions changed since they were
+        last scraped are read and yielded. Bills that have been removed are written to the
+        tombstones file either way.
+        @return: yield Bill instance
+        """
+
+        # start the scraper to pull in all the bill data
+        runner = self.run_unitedstates_bill_scraper(congresses)
+
+        index = BillIndex(self.bill_index_db, settings.SCRAPED_DATA_DIR)
+        manifest = BillManifest(self.bill_index_db)
+        manifest.load(settings.SCRAPED_DATA_DIR)
+        handled = set()
+
+        if runner is not None:
+            for congress in runner.completed():
+                bills = index.update(congresses=[congress])
+                self.info('{n} bills indexed for congress {c}, {l} directories listed, {r} unchanged'.format(
+                    n=len(bills), c=congress, l=index.listed, r=index.reused))
+                yield from self.convert_changed(bills, manifest, handled, incremental, workers)
+
+        # upstream is done: go over the whole tree for what no finished congress covered
+        bills = index.update()
+        self.info('{n} bills indexed, {l} directories listed, {r} unchanged'.format(
+            n=len(bills), l=index.listed, r=index.reused))
+
+        # bills scraped before that aren't there any more
+        deleted = sorted(manifest.bills.keys() - bills.keys(), key=BillIndex.sort_key)
+        if deleted:
+            self.write_tombstones(deleted)
+            manifest.forget(deleted)
+
+        yield from self.convert_changed(bills, manifest, handled, incremental, workers)
+
+        index.close()
+        manifest.close()
+
+        if runner is not None:
+            for result in runner.wait():
+                self.info('upstream {n}: exit code {r}, {s:.1f}s'.format(
+                    n=result.name, r=result.returncode, s=result.seconds))
+            for result in runner.failed():
+                self.warning('upstream {n} failed with exit code {r}'.format(
+                    n=result.name, r=result.returncode))
+
+    def convert_changed(self, bills, manifest, handled, incremental, workers):
+        """
+        Converts the bills not already handled this run, or in incremental mode the ones that changed since
+        they were last scraped, leaving out any whose files are unchanged since
+
         @return: yield Bill instance
         """
+        to_scrape = []
+        touched = []
+        for key in sorted(bills, key=BillIndex.sort_key):
+            states = manifest.file_states(key, bills[key])
+            if (incremental or key in handled) and not manifest.changed(key, states):
+                if states != manifest.bills[key]:
+                    touched.append((key, states))
+                continue
+            to_scrape.append((key, states))
+        manifest.record(touched)
+        if incremental:
+            self.info('{n} of {t} bills changed since they were last scraped'.format(
+                n=len(to_scrape), t=len(bills)))
 
-        # run scraper first to pull in all the bill data
-        self.run_unitedstates_bill_scraper()
-        # iterate over all the files and build and yield Bill objects
-        for filename in find_files(settings.SCRAPED_DATA_DIR, '.*[a-z]*\/[a-z]*[0-9]*\/data\.json'):
-            try:
-                with open(filename) as json_file:
-                    json_data = json.load(json_file)
-                    # Initialize Object
-                    bill = Bill(self.TYPE_MAP[json_data['bill_type']]['canonical'] + ' ' + json_data['number'],
-                                json_data['congress'],
-                                json_data['official_title'],
-                                chamber=self.TYPE_MAP[json_data['bill_type']]['chamber']
-                    )
-
-                    # Basics
-                    bill.type = [json_data['bill_type']]
-                    bill.subject = json_data['subjects']
-                    bill.add_summary(json_data['summary']['as'],
-                                     json_data['summary']['text'],
-                                     json_data['summary']['date'])
-
-                    # Common Fields
-                    bill.sources = [{'url': json_data['url'], 'note': 'all'}]
-
-                    # Other/Related Bills
-                    bill.other_titles = [{'note': t['type'], 'title': t['title']} for t in json_data['titles']]
-                    # change value of relationship_type to 'type' field from json_data when permitted by schema
-                    bill.related_bills = [{'session': b['session'], 'name': b['name'], 'relationship_type':'companion'}
-                                          for b in json_data['related_bills']]
-
-                    # add primary sponsor
-                    bill.add_sponsorship_by_identifier(json_data['sponsor']['name'], 'person', 'person', True,
-                                                       scheme='thomas_id',
-                                                       identifier=json_data['sponsor']['thomas_id'],
-                                                       chamber=self.TYPE_MAP[json_data['bill_type']]['chamber'])
-
-                    # add cosponsors
-                    for cs in json_data['cosponsors']:
-                        bill.add_sponsorship_by_identifier(cs['name'], 'person', 'person', False,
-                                                           scheme='thomas_id', identifier=cs['thomas_id'],
-                                                           chamber=self.TYPE_MAP[json_data['bill_type']]['chamber'])
-
-                    # add introduced_at and actions
-                    bill.actions.append({'date': json_data['introduced_at'], 'type': 'introduced',
-                                         'description': 'date of introduction',
-                                         'actor': self.TYPE_MAP[json_data['bill_type']]['chamber'],
-                                         'related_entities': []})
-                    for action in json_data['actions']:
-                        bill.actions.append({'date': action['acted_at'],
-                                             'type': [action['type']],
-                                             'description': action['text'],
-                                             'actor': self.TYPE_MAP[json_data['bill_type']]['chamber'],
-                                             'related_entities': []
-                                             })
-
-                    # add bill versions
-                    for version_path in find_files(os.path.join(settings.SCRAPED_DATA_DIR,
-                                                   'data', bill.session, 'bills', json_data['bill_type'],
-                                                   json_data['bill_type'] + json_data['number'],
-                                                   'text-versions'), '*\.json'):
-                        try:
-                            with open(version_path) as version_file:
-                                version_json_data = json.load(version_file)
-                                for k, v in version_json_data['urls'].iteritems():
-                                    bill.versions.append({'date': version_json_data['issued_on'],
-                                                          'type': version_json_data['version_code'],
-                                                          'name': self.VERSION_MAP[version_json_data['version_code']],
-                                                          'links': [{'mimetype': k, 'url': v}]})
-                        except IOError:
-                            print("Unable to open or parse file with path " + version_path)
-                            continue
-
-                    yield bill
-
-            except IOError:
-                print("Unable to open or parse file with path " + filename)
+        yield from self.convert_bills(bills, to_scrape, manifest, handled, workers)
+
+    def convert_bills(self, bills, to_scrape, manifest, handled, workers):
+        """
+        Reads the bill files in parallel, in the order given, and notes each bill in the
+        manifest once it's been yielded
+
+        @return: yield Bill instance
+        """
+        scraped = []
+        bill_files = [bills[key] for key, states in to_scrape]
+        read = read_bills(bill_files, workers=workers, chunksize=self.chunksize)
+        for (key, states), (files, record) in zip(to_scrape, read):
+            if record is None:
+                self.warning("Unable to open or parse file with path " + files.data)
                 continue
+            for version_path in record['unreadable']:
+                self.warning("Unable to open or parse file with path " + version_path)
+            yield self.build_bill(record)
+
+            handled.add(key)
+            scraped.append((key, states))
+            if len(scraped) >= self.manifest_batch:
+                manifest.record(scraped)
+                scraped = []
+        manifest.record(scraped)
+
+    def write_tombstones(self, keys):
+        """
+        Appends a record of each deleted bill to the tombstones file, as a line of JSON
+
+        @return: void
+        """
+        removed_at = datetime.datetime.utcnow().isoformat()
+        with open(self.bill_tombstones, 'a') as tombstones:
+            for congress, bill_type, number in keys:
+                identifier = self.TYPE_MAP[bill_type]['canonical'] + ' ' + number
+                self.warning('bill {i} of the {c}th congress has been removed'.format(
+                    i=identifier, c=congress))
+                tombstones.write(json.dumps({'identifier': identifier,
+                                             'legislative_session': congress,
+                                             'bill_type': bill_type,
+                                             'number': number,
+                                             'removed_at': removed_at}) + '\n')
+
+    def build_bill(self, record):
+        """
+        Builds an OCD-compliant bill model from the data read by read_bill
+
+        @return: Bill instance
+        """
+        # Initialize Object
+        bill = Bill(record['identifier'],
+                    record['legislative_session'],
+                    record['title'],
+                    chamber=record['chamber']
+        )
+
+        # Basics
+        bill.type = record['type']
+        bill.subject = record['subject']
+        bill.add_summary(*record['summary'])
+
+        # Common Fields
+        bill.sources = record['sources']
+
+        # Other/Related Bills
+        bill.other_titles = record['other_titles']
+        bill.related_bills = record['related_bills']
+
+        # add primary sponsor and cosponsors
+        for name, primary, thomas_id in record['sponsors']:
+            bill.add_sponsorship_by_identifier(name, 'person', 'person', primary,
+                                               scheme='thomas_id', identifier=thomas_id,
+                                               chamber=record['chamber'])
+
+        # add introduced_at and actions
+        bill.actions.extend(record['actions'])
+
+        # add bill versions
+        bill.versions.extend(record['versions'])
+
+        return bill
 
-    def scrape(self):
-        yield from self.scrape_bills()
+    def scrape(self, workers=None, incremental=None, congresses=None):
+        if workers is not None:
+            workers = int(workers)
+        if incremental is None:
+            incremental = self.incremental
+        yield from self.scrape_bills(workers=workers, incremental=truthy(incremental),
+                                     congresses=congresses)
@@ -0,0 +1,335 @@
+"""
+    Index of the bill files in a unitedstates/congress data tree.
+
+    The tree is laid out as
+
+        data/{congress}/bills/{bill_type}/{bill_type}{number}/data.json
+        data/{congress}/bills/{bill_type}/{bill_type}{number}/text-versions/{code}/data.json
+
+    and the index is built by descending exactly those levels with
+    os.scandir. What was found is kept between runs along with the mtimes of
+    the directories it was found in, and a directory is only listed again
+    once its mtime changes, so updating the index for an unchanged tree
+    costs a few stats per bill.
+
+    The manifest kept alongside records what each bill's files held when it
+    was last scraped, so bills that haven't changed can be left out.
+"""
+import os
+import json
+import time
+
+from collections import defaultdict, namedtuple
+
+from .cache import SQLiteStore, sha1_file
+
+
+BillFiles = namedtuple('BillFiles', ['data', 'versions'])
+
+# what was found in a bill's directory, and the mtimes it was found with
+BillEntry = namedtuple('BillEntry', ['key', 'files', 'codes', 'mtimes'])
+
+# nothing found in directories changed this recently is kept, since another
+# change within the same mtime tick would go unnoticed
+RACY_SECONDS = 2
+
+
+def mtime_ns(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return -1
+
+
+class BillIndex(SQLiteStore):
+    """
+        Maps ``(congress, bill_type, number)`` to the ``BillFiles`` of every
+        bill under ``root``.
+    """
+    schema = '''
+        CREATE TABLE IF NOT EXISTS bill_directories (
+            path TEXT PRIMARY KEY,
+            mtime_ns INTEGER NOT NULL,
+            subdirs TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS bill_files (
+            path TEXT PRIMARY KEY,
+            congress TEXT NOT NULL,
+            bill_type TEXT NOT NULL,
+            number TEXT NOT NULL,
+            data TEXT,
+            versions TEXT NOT NULL,
+            codes TEXT NOT NULL,
+            mtimes TEXT NOT NULL
+        );
+    '''
+
+    def __init__(self, path, root):
+        super().__init__(path)
+        self.root = os.path.abspath(root)
+        self.listed = 0
+        self.reused = 0
+
+    def _under_root(self, table, columns):
+        prefix = self.root + os.sep
+        return self.execute('SELECT {c} FROM {t} WHERE substr(path, 1, ?) = ?'
+                            .format(c=columns, t=table),
+                            (len(prefix), prefix))
+
+    def _load(self):
+        self._directories = {
+            path: (mtime, json.loads(subdirs)) for path, mtime, subdirs
+            in self._under_root('bill_directories', 'path, mtime_ns, subdirs')
+        }
+        self._bills = {}
+        for row in self._under_root('bill_files', 'path, congress, '
+                                    'bill_type, number, data, versions, '
+                                    'codes, mtimes'):
+            path, congress, bill_type, number, data, versions, codes, \
+                mtimes = row
+            self._bills[path] = BillEntry(
+                (congress, bill_type, number),
+                BillFiles(data, tuple(versions.split('\n')) if versions
+                          else ()),
+                codes.split('\n') if codes else [],
+                mtimes)
+
+    def _recent(self, mtime):
+        return mtime >= self._started - RACY_SECONDS * 10 ** 9
+
+    def _subdirs(self, path):
+        """
+            The names of the directories in ``path``, from the stored listing
+            if it hasn't changed since.
+        """
+        mtime = mtime_ns(path)
+        if mtime < 0:
+            return []
+        self._seen_directories.add(path)
+
+        known = self._directories.get(path)
+        if known is not None and known[0] == mtime:
+            self.reused += 1
+            return known[1]
+
+        with os.scandir(path) as it:
+            subdirs = sorted(e.name for e in it if e.is_dir())
+        self.listed += 1
+        if not self._recent(mtime):
+            self._changed_directories.append((path, mtime,
+                                              json.dumps(subdirs)))
+        return subdirs
+
+    def _json_files(self, path):
+        with os.scandir(path) as it:
+            return [e.path for e in it
+                    if e.name.endswith('.json') and e.is_file()]
+
+    def _bill(self, bill_dir, key):
+        """
+            The ``BillEntry`` for the bill in ``bill_dir``, from the index if
+            none of its directories have changed since it was stored.
+        """
+        sep = os.sep
+        versions_dir = bill_dir + sep + 'text-versions'
+
+        known = self._bills.get(bill_dir)
+        if known is not None:
+            mtimes = [mtime_ns(bill_dir), mtime_ns(versions_dir)]
+            mtimes.extend(mtime_ns(versions_dir + sep + code)
+                          for code in known.codes)
+            if ' '.join(map(str, mtimes)) == known.mtimes:
+                self.reused += 1
+                return known
+
+        self.listed += 1
+        mtimes = [mtime_ns(bill_dir), mtime_ns(versions_dir)]
+        data = bill_dir + sep + 'data.json'
+        if not os.path.isfile(data):
+            data = None
+
+        versions = []
+        codes = []
+        if mtimes[1] >= 0:
+            versions.extend(self._json_files(versions_dir))
+            with os.scandir(versions_dir) as it:
+                codes = sorted(e.name for e in it if e.is_dir())
+            for code in codes:
+                code_dir = versions_dir + sep + code
+                mtimes.append(mtime_ns(code_dir))
+                versions.extend(self._json_files(code_dir))
+
+        entry = BillEntry(key, BillFiles(data, tuple(sorted(versions))),
+                          codes, ' '.join(map(str, mtimes)))
+        if not any(self._recent(mtime) for mtime in mtimes):
+            self._changed_bills.append((bill_dir, entry))
+        return entry
+
+    def update(self, congresses=None):
+        """
+            Bring the index up to date with the tree and return it, or only
+            the part of both under the directories of ``congresses``.
+        """
+        self._started = time.time_ns()
+        self._load()
+        self._changed_directories = []
+        self._changed_bills = []
+        self._seen_directories = set()
+        self.listed = self.reused = 0
+
+        bills = {}
+        seen_bills = set()
+        sep = os.sep
+        data_dir = self.root + sep + 'data'
+        if congresses is None:
+            scope = None
+            congresses = [c for c in self._subdirs(data_dir) if c.isdigit()]
+        else:
+            congresses = [str(c) for c in congresses]
+            scope = tuple(data_dir + sep + c + sep for c in congresses)
+        for congress in congresses:
+            bills_dir = data_dir + sep + congress + sep + 'bills'
+            for bill_type in self._subdirs(bills_dir):
+                type_dir = bills_dir + sep + bill_type
+                for name in self._subdirs(type_dir):
+                    number = name[len(bill_type):]
+                    if not name.startswith(bill_type) or not number.isdigit():
+                        continue
+                    bill_dir = type_dir + sep + name
+                    seen_bills.add(bill_dir)
+                    entry = self._bill(bill_dir, (congress, bill_type, number))
+                    if entry.files.data is not None:
+                        bills[entry.key] = entry.files
+
+        self._save(seen_bills, scope)
+        self._directories = self._bills = None
+        return bills
+
+    def _save(self, seen_bills, scope=None):
+        """
+            Store what changed, and forget what has gone from under the
+            ``scope`` prefixes that were looked at (everywhere for None).
+        """
+        def in_scope(path):
+            return scope is None or path.startswith(scope)
+
+        self.executemany('INSERT OR REPLACE INTO bill_directories '
+                         '(path, mtime_ns, subdirs) VALUES (?, ?, ?)',
+                         self._changed_directories)
+        self.executemany('DELETE FROM bill_directories WHERE path = ?',
+                         [(path,) for path in self._directories
+                          if path not in self._seen_directories and
+                          in_scope(path)])
+
+        rows = []
+        for bill_dir, entry in self._changed_bills:
+            rows.append((bill_dir,) + entry.key +
+                        (entry.files.data, '\n'.join(entry.files.versions),
+                         '\n'.join(entry.codes), entry.mtimes))
+        self.executemany('INSERT OR REPLACE INTO bill_files '
+                         '(path, congress, bill_type, number, data, versions, '
+                         'codes, mtimes) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                         rows)
+        self.executemany('DELETE FROM bill_files WHERE path = ?',
+                         [(path,) for path in self._bills
+                          if path not in seen_bills and in_scope(path)])
+
+    @staticmethod
+    def sort_key(key):
+        congress, bill_type, number = key
+        return int(congress), bill_type, int(number)
+
+
+FileState = namedtuple('FileState', ['mtime_ns', 'size', 'sha1'])
+
+
+class BillManifest(SQLiteStore):
+    """
+        The state of every file of every bill as of the last time the bill was
+        scraped, for telling which bills have changed since.
+
+        Files are told apart by mtime and size. One is only hashed when its
+        mtime has changed but its size hasn't, so bills that were merely
+        touched still count as unchanged; new files and files of a new size
+        are recorded without a hash, which never matches.
+    """
+    schema = '''
+        CREATE TABLE IF NOT EXISTS bill_manifest (
+            path TEXT PRIMARY KEY,
+            congress TEXT NOT NULL,
+            bill_type TEXT NOT NULL,
+            number TEXT NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            sha1 TEXT
+        );
+        CREATE INDEX IF NOT EXISTS bill_manifest_bill
+            ON bill_manifest (congress, bill_type, number);
+    '''
+
+    def load(self, root):
+        """
+            Read the manifest for the bills under ``root``, as
+            ``{key: {path: FileState}}``.
+        """
+        prefix = os.path.abspath(root) + os.sep
+        self.bills = defaultdict(dict)
+        for row in self.execute('SELECT congress, bill_type, number, path, '
+                                'mtime_ns, size, sha1 FROM bill_manifest '
+                                'WHERE substr(path, 1, ?) = ?',
+                                (len(prefix), prefix)):
+            self.bills[row[:3]][row[3]] = FileState(*row[4:])
+        return self.bills
+
+    def file_states(self, key, bill_files):
+        """
+            The current ``FileState`` of each of a bill's files.
+        """
+        paths = (bill_files.data,) + bill_files.versions
+        stats = [os.stat(path) for path in paths]
+
+        known = self.bills.get(key, {})
+        states = {}
+        for path, stat in zip(paths, stats):
+            state = known.get(path)
+            if state is None or state.size != stat.st_size:
+                state = FileState(stat.st_mtime_ns, stat.st_size, None)
+            elif state.mtime_ns != stat.st_mtime_ns:
+                state = FileState(stat.st_mtime_ns, stat.st_size,
+                                  sha1_file(path))
+            states[path] = state
+        return states
+
+    def changed(self, key, states):
+        known = self.bills.get(key, {})
+        if known.keys() != states.keys():
+            return True
+        for path, state in states.items():
+            old = known[path]
+            if (old.mtime_ns, old.size) == (state.mtime_ns, state.size):
+                continue
+            if state.sha1 is None or state.sha1 != old.sha1:
+                return True
+        return False
+
+    def record(self, bills):
+        """
+            Save the states of ``[(key, states), ...]``.
+        """
+        self.executemany('DELETE FROM bill_manifest WHERE congress = ? AND '
+                         'bill_type = ? AND number = ?',
+                         [key for key, states in bills])
+        self.executemany('INSERT INTO bill_manifest (path, congress, '
+                         'bill_type, number, mtime_ns, size, sha1) '
+                         'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                         [(path,) + key + tuple(state)
+                          for key, states in bills
+                          for path, state in states.items()])
+        for key, states in bills:
+            self.bills[key] = states
+
+    def forget(self, keys):
+        self.executemany('DELETE FROM bill_manifest WHERE congress = ? AND '
+                         'bill_type = ? AND number = ?', keys)
+        for key in keys:
+            self.bills.pop(key, None)
@@ -0,0 +1,354 @@
+"""
+    Small on-disk stores that let scrapers skip work an earlier run already
+    did.
+"""
+import os
+import glob
+import pickle
+import hashlib
+import sqlite3
+import threading
+
+import yaml
+
+from collections import namedtuple
+from datetime import timedelta
+
+# the libyaml loader is many times faster than the pure Python one, and
+# builds the same objects
+SafeLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+def truthy(value):
+    """
+        Interpret a flag that may have come in as a string from the command
+        line (``refresh=true``).
+    """
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'y', 'on')
+    return bool(value)
+
+
+def sha1_bytes(content):
+    return hashlib.sha1(content).hexdigest()
+
+
+def sha1_file(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_yaml(filename, cache_dir):
+    """
+        Load a YAML file, keeping what it parsed to in ``cache_dir`` as a
+        pickle named after the hash of its content, so the same content is
+        only ever parsed once.
+    """
+    with open(filename, 'rb') as f:
+        content = f.read()
+    name = os.path.basename(filename)
+    cached = os.path.join(cache_dir, '{n}.{h}.pickle'.format(
+        n=name, h=sha1_bytes(content)))
+    try:
+        with open(cached, 'rb') as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        pass
+
+    data = yaml.load(content, Loader=SafeLoader)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    for stale in glob.glob(os.path.join(glob.escape(cache_dir),
+                                        glob.escape(name) + '.*.pickle')):
+        os.remove(stale)
+    with open(cached + '.tmp', 'wb') as f:
+        pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(cached + '.tmp', cached)
+    return data
+
+
+class SQLiteStore(object):
+    """
+        A SQLite database shared by all threads of a scrape.
+
+        Subclasses set ``schema`` to the statements creating their tables;
+        several stores can live in the same file.
+    """
+    schema = ''
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(self.schema)
+
+    def execute(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def executemany(self, sql, seq_of_params):
+        with self._lock:
+            self._conn.execute('BEGIN')
+            try:
+                self._conn.executemany(sql, seq_of_params)
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+FilingEntry = namedtuple('FilingEntry', ['filing_id', 'url', 'html_sha1',
+                                         'parsed_path', 'html_mtime_ns',
+                                         'html_size'])
+
+Have = namedtuple('Have', ['url', 'parsed'])
+
+
+class FilingIndex(SQLiteStore):
+    """
+        Which filings we already hold, keyed by filing id.
+
+        Each entry records the SHA-1 of the HTML a parse was made from, so a
+        parsed form is only reused while the cached HTML it came from is
+        unchanged, and the file the parsed form was written to, or NULL when
+        forms are kept in segments. The mtime and size of the HTML are kept
+        too, and it's only hashed again once they change.
+    """
+    schema = '''
+        CREATE TABLE IF NOT EXISTS filings (
+            filing_id TEXT PRIMARY KEY,
+            url TEXT,
+            html_sha1 TEXT NOT NULL,
+            parsed_path TEXT,
+            html_mtime_ns INTEGER,
+            html_size INTEGER
+        );
+    '''
+
+    def __init__(self, path):
+        super().__init__(path)
+        # indexes made before the mtime and size were kept
+        columns = {row[1] for row
+                   in self.execute('PRAGMA table_info(filings)')}
+        for column in ('html_mtime_ns', 'html_size'):
+            if column not in columns:
+                self.execute('ALTER TABLE filings ADD COLUMN {c} '
+                             'INTEGER'.format(c=column))
+
+    def get(self, filing_id):
+        rows = self.execute('SELECT filing_id, url, html_sha1, parsed_path, '
+                            'html_mtime_ns, html_size FROM filings '
+                            'WHERE filing_id = ?', (filing_id,))
+        return FilingEntry(*rows[0]) if rows else None
+
+    def add(self, filing_id, url, html_path, html_sha1, parsed_path,
+            html_stat=None):
+        if html_stat is None:
+            html_stat = os.stat(html_path)
+        self.execute('INSERT OR REPLACE INTO filings '
+                     '(filing_id, url, html_sha1, parsed_path, '
+                     'html_mtime_ns, html_size) VALUES (?, ?, ?, ?, ?, ?)',
+                     (filing_id, url, html_sha1, parsed_path,
+                      html_stat.st_mtime_ns, html_stat.st_size))
+
+    def lookup(self, filing_id, html_path, parsed_path, parsed_exists):
+        """
+            Return what we have on disk for a filing, or None if it has to be
+            downloaded.
+
+            ``Have.parsed`` is true when the parsed form (which the caller
+            says exists or not, since forms may live in a segment store
+            rather than a file of their own) can be used as is, false when
+            only the HTML is usable and needs parsing again. Filings cached
+            before the index existed are adopted the first time they are
+            looked up, with ``parsed_path`` as where their form was written.
+        """
+        try:
+            html_stat = os.stat(html_path)
+        except FileNotFoundError:
+            return None
+
+        entry = self.get(filing_id)
+        if entry is not None and \
+                entry.html_mtime_ns == html_stat.st_mtime_ns and \
+                entry.html_size == html_stat.st_size:
+            html_sha1 = entry.html_sha1
+        else:
+            html_sha1 = sha1_file(html_path)
+            if entry is not None and entry.html_sha1 == html_sha1:
+                # only touched, no need to hash it again next time
+                self.add(filing_id, entry.url, html_path, html_sha1,
+                         entry.parsed_path, html_stat)
+
+        if entry is not None and entry.html_sha1 != html_sha1:
+            return Have(entry.url, False)
+
+        if not parsed_exists:
+            return Have(entry.url if entry else None, False)
+
+        if entry is None:
+            self.add(filing_id, None, html_path, html_sha1, parsed_path,
+                     html_stat)
+            return Have(None, True)
+
+        return Have(entry.url, True)
+
+
+class SeenResults(SQLiteStore):
+    """
+        Search result rows whose filings have already been scraped, keyed
+        the way search_filings defines duplicates: (registrant, client,
+        filing type, filing date).
+    """
+    schema = '''
+        CREATE TABLE IF NOT EXISTS search_results (
+            registrant TEXT NOT NULL,
+            client TEXT NOT NULL,
+            filing_type TEXT NOT NULL,
+            filing_date TEXT NOT NULL,
+            filing_id TEXT,
+            PRIMARY KEY (registrant, client, filing_type, filing_date)
+        );
+        CREATE INDEX IF NOT EXISTS search_results_filing_id
+            ON search_results (filing_id);
+    '''
+
+    @staticmethod
+    def _key(result_key):
+        # blank cells come through as None, which sqlite never matches
+        return tuple(v or '' for v in result_key)
+
+    def __contains__(self, result_key):
+        return bool(self.execute(
+            'SELECT 1 FROM search_results WHERE registrant = ? AND '
+            'client = ? AND filing_type = ? AND filing_date = ?',
+            self._key(result_key)))
+
+    def has_filing(self, filing_id):
+        return bool(self.execute(
+            'SELECT 1 FROM search_results WHERE filing_id = ?', (filing_id,)))
+
+    def add(self, result_key, filing_id=None):
+        self.execute('INSERT OR REPLACE INTO search_results '
+                     '(registrant, client, filing_type, filing_date, '
+                     'filing_id) VALUES (?, ?, ?, ?, ?)',
+                     self._key(result_key) + (filing_id,))
+
+
+class ScrapeCheckpoint(SQLiteStore):
+    """
+        Days whose search results have been scraped in full, per filing type.
+
+        A day only counts once it is over, since postings can keep arriving
+        until then.
+    """
+    schema = '''
+        CREATE TABLE IF NOT EXISTS completed_days (
+            filing_type TEXT NOT NULL,
+            day TEXT NOT NULL,
+            PRIMARY KEY (filing_type, day)
+        );
+    '''
+
+    @staticmethod
+    def days(start_date, end_date):
+        day = start_date
+        while day <= end_date:
+            yield day
+            day += timedelta(days=1)
+
+    def completed_days(self, filing_type, start_date, end_date):
+        return {r[0] for r in self.execute(
+            'SELECT day FROM completed_days WHERE filing_type = ? AND '
+            'day BETWEEN ? AND ?',
+            (filing_type, start_date.strftime('%Y-%m-%d'),
+             end_date.strftime('%Y-%m-%d')))}
+
+    def pending_windows(self, filing_type, start_date, end_date):
+        """
+            Split a date range into the runs of days not yet completed.
+        """
+        completed = self.completed_days(filing_type, start_date, end_date)
+        windows = []
+        for day in self.days(start_date, end_date):
+            if day.strftime('%Y-%m-%d') in completed:
+                continue
+            if windows and windows[-1][1] + timedelta(days=1) == day:
+                windows[-1] = (windows[-1][0], day)
+            else:
+                windows.append((day, day))
+        return windows
+
+    def complete(self, filing_type, start_date, end_date):
+        self.executemany('INSERT OR IGNORE INTO completed_days '
+                         '(filing_type, day) VALUES (?, ?)',
+                         [(filing_type, day.strftime('%Y-%m-%d'))
+                          for day in self.days(start_date, end_date)])
+
+    def high_water_mark(self, filing_types):
+        """
+            The last day completed for every one of ``filing_types``, as a
+            'YYYY-MM-DD' string, or None if any of them has nothing yet.
+        """
+        marks = []
+        for filing_type in filing_types:
+            rows = self.execute('SELECT MAX(day) FROM completed_days '
+                                'WHERE filing_type = ?', (filing_type,))
+            if not rows or rows[0][0] is None:
+                return None
+            marks.append(rows[0][0])
+        return min(marks) if marks else None
+
+
+class ValidatorStore(SQLiteStore):
+    """
+        The ETag and Last-Modified headers of the last download of each URL,
+        and where it was saved, for making conditional requests.
+    """
+    schema = '''
+        CREATE TABLE IF NOT EXISTS validators (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            path TEXT NOT NULL
+        );
+    '''
+
+    def headers(self, url, path):
+        """
+            The conditional request headers for ``url``, or none if we don't
+            still have the copy at ``path`` they would vouch for.
+        """
+        rows = self.execute('SELECT etag, last_modified FROM validators '
+                            'WHERE url = ? AND path = ?', (url, path))
+        if not rows or not os.path.exists(path):
+            return {}
+        etag, last_modified = rows[0]
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        return headers
+
+    def add(self, url, headers, path):
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if etag or last_modified:
+            self.execute('INSERT OR REPLACE INTO validators '
+                         '(url, etag, last_modified, path) '
+                         'VALUES (?, ?, ?, ?)',
+                         (url, etag, last_modified, path))
+        else:
+            self.execute('DELETE FROM validators WHERE url = ?', (url,))
@@ -1,17 +1,27 @@
 from pupa.scrape import Scraper, Organization
-from urllib import request
-import yaml
+from pupa import settings
+import os
 
-class UnitedStatesCommitteeScraper(Scraper):
+from .cache import load_yaml
+from .http_pool import ConditionalGetMixin, PooledSessionMixin
+
+class UnitedStatesCommitteeScraper(ConditionalGetMixin, PooledSessionMixin,
+                                   Scraper):
     
     def fetch_yaml(self, source):
-        committee_string = request.urlopen(source)
-        return yaml.safe_load(committee_string)
+        # None when the file hasn't changed since the last run
+        filename = os.path.join(settings.CACHE_DIR, os.path.basename(source))
+        filename, response = self.retrieve_if_modified(source, filename)
+        if response is None:
+            return None
+        return load_yaml(filename, os.path.join(settings.CACHE_DIR, 'yaml'))
     
     def scrape_committees(self, repos):
         for repo in repos:
             source = "https://raw.githubusercontent.com/unitedstates/congress-legislators/master/{0}".format(repo)
             committees = self.fetch_yaml(source)
+            if committees is None:
+                continue
             for committee in committees:
                 org = Organization(committee['name'], 
                                    classification='committee')
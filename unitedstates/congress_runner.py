@@ -0,0 +1,151 @@
+"""
+    Runs the unitedstates/congress scrapers that feed the bill scraper.
+
+    Each upstream task (``run bills``, ``run bill_versions``, optionally one
+    per congress) gets its own subprocess, up to ``max_workers`` at a time.
+    Their output is streamed to the log line by line as it arrives, and the
+    time and exit code of every task are kept. ``completed`` hands back each
+    congress as soon as the last task covering it exits.
+"""
+import time
+import queue
+import logging
+import subprocess
+import threading
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+
+# congress is None for a task that scrapes every congress
+UpstreamTask = namedtuple('UpstreamTask', ['name', 'cmd', 'congress'])
+
+TaskResult = namedtuple('TaskResult', ['name', 'returncode', 'seconds'])
+
+UPSTREAM_SCRAPERS = ['bills', 'bill_versions']
+
+
+def parse_congresses(congresses):
+    """
+        Turn a ``congresses`` argument (``114``, ``110-114`` or ``113,114``)
+        into a sorted list of congress numbers, or None for no sharding.
+    """
+    if congresses is None:
+        return None
+    selected = set()
+    for part in str(congresses).split(','):
+        if '-' in part:
+            first, last = part.split('-', 1)
+            selected.update(range(int(first), int(last) + 1))
+        else:
+            selected.add(int(part))
+    return sorted(selected)
+
+
+class CongressRunner(object):
+
+    def __init__(self, python_bin, congress_path, cwd, congresses=None,
+                 max_workers=4):
+        self.cwd = cwd
+        self.max_workers = max_workers
+        self.logger = logging.getLogger("congress")
+        self.results = []
+
+        run = [python_bin, congress_path.rstrip('/') + '/run']
+        self.tasks = []
+        for scraper in UPSTREAM_SCRAPERS:
+            if congresses is None:
+                self.tasks.append(UpstreamTask(scraper, run + [scraper], None))
+            else:
+                for congress in congresses:
+                    self.tasks.append(UpstreamTask(
+                        '{s}-{c}'.format(s=scraper, c=congress),
+                        run + [scraper, '--congress={}'.format(congress)],
+                        congress))
+
+        self._lock = threading.Lock()
+        self._pool = None
+        self._futures = []
+        # congresses as they finish, then None once every task has
+        self._finished = queue.Queue()
+        self._reported = set()
+
+    def run_task(self, task):
+        start = time.time()
+        self.logger.info('[{n}] starting: {c}'.format(n=task.name,
+                                                      c=' '.join(task.cmd)))
+        process = subprocess.Popen(task.cmd, cwd=self.cwd,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT,
+                                   universal_newlines=True)
+        for line in process.stdout:
+            self.logger.info('[{n}] {l}'.format(n=task.name,
+                                                l=line.rstrip('\n')))
+        returncode = process.wait()
+
+        result = TaskResult(task.name, returncode, time.time() - start)
+        with self._lock:
+            self.results.append(result)
+        log = self.logger.info if returncode == 0 else self.logger.warning
+        log('[{n}] exited with {r} after {s:.1f}s'.format(
+            n=task.name, r=returncode, s=result.seconds))
+        return result
+
+    def start(self):
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        self._futures = [self._pool.submit(self.run_task, task)
+                         for task in self.tasks]
+        for future in self._futures:
+            future.add_done_callback(self._task_done)
+        self._pool.shutdown(wait=False)
+
+    def _task_done(self, future):
+        with self._lock:
+            if None in self._reported:
+                return
+            for congress in sorted(self.done_congresses() - self._reported):
+                self._reported.add(congress)
+                self._finished.put(congress)
+            if self.done():
+                self._reported.add(None)
+                self._finished.put(None)
+
+    def completed(self):
+        """
+            Yield each congress as soon as every task covering it has
+            exited, until they all have.
+        """
+        while True:
+            congress = self._finished.get()
+            if congress is None:
+                return
+            yield congress
+
+    def done(self):
+        return all(f.done() for f in self._futures)
+
+    def done_congresses(self):
+        """
+            The congresses whose tasks have all exited. A task run without a
+            congress covers all of them, so none is done before it is.
+        """
+        congresses = set()
+        running = set()
+        for task, future in zip(self.tasks, self._futures):
+            if task.congress is None:
+                if not future.done():
+                    return set()
+                continue
+            congresses.add(task.congress)
+            if not future.done():
+                running.add(task.congress)
+        return congresses - running
+
+    def wait(self):
+        """
+            Wait for every task and return their results, in task order.
+        """
+        return [f.result() for f in self._futures]
+
+    def failed(self):
+        return [r for r in self.results if r.returncode != 0]
@@ -1,15 +1,19 @@
 import os
 import json
 import re
-from datetime import datetime
+from collections import namedtuple, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from functools import partial
 from urllib.parse import urlparse, parse_qsl
-from io import BytesIO
 from zipfile import ZipFile
 
-from lxml.html import HTMLParser
 from lxml import etree
 
 import pytz
+import scrapelib
+
+from requests import Request
 
 from pupa import settings
 from pupa.scrape import BaseDisclosureScraper
@@ -19,143 +23,468 @@ from pupa.utils import combine_dicts, canonize_url
 from unitedstates.ref import sopr_lobbying_reference
 
 from .form_parsing.utils import mkdir_p
+from .http_pool import ConditionalGetMixin, PooledSessionMixin
+from .pipeline import ordered_pipeline, HostRateLimiter, Parsed
+from .cache import (FilingIndex, SeenResults, ScrapeCheckpoint, sha1_bytes,
+                    truthy)
 
+from .form_parsing.sinks import form_sink
+from .form_parsing.validation import FormValidation
 from .form_parsing import (UnitedStatesLobbyingRegistrationParser,
                            UnitedStatesSenatePostEmploymentParser,
                            UnitedStatesHousePostEmploymentParser)
 
 UTC = pytz.timezone('UTC')
 
+SEARCH_URL_RGX = re.compile(r"window\.open\('(.*?)'\)", re.IGNORECASE)
+
+SearchResult = namedtuple('SearchResult', ['registrant', 'client',
+                                           'filing_type', 'filing_date',
+                                           'params'])
+
+CompletedWindow = namedtuple('CompletedWindow', ['filing_type', 'start_date',
+                                                 'end_date'])
+
+FetchedFiling = namedtuple('FetchedFiling', ['filename', 'url', 'content'])
+
+
+def parse_filing(parser_class, parse_dir, fetched, output=None,
+                 strict_validation=True, defer_validation=False):
+    """
+        Parse a single downloaded filing into its form.
+
+        Module level so it can run in the pipeline's worker processes.
+    """
+    mkdir_p(parse_dir)
+
+    parser = parser_class(None, parse_dir,
+                          strict_validation=strict_validation, output=output,
+                          defer_validation=defer_validation)
+    doc_id = os.path.basename(os.path.splitext(fetched.filename)[0])
+
+    forms = [f for f in parser.do_parse(root=fetched.content,
+                                        document_id=doc_id)]
+    if len(forms) > 1:
+        raise Exception('more than one form in a filing?')
+    elif len(forms) == 0:
+        raise Exception('no forms in filing {}'.format(fetched.filename))
+    else:
+        return forms[0]
+
+
+def iter_report(parser_class, parse_dir, fetched, output=None,
+                strict_validation=True, defer_validation=False):
+    """
+        Parse the forms in a downloaded report one at a time, as they are
+        asked for.
+    """
+    mkdir_p(parse_dir)
+
+    parser = parser_class(None, parse_dir,
+                          strict_validation=strict_validation, output=output,
+                          defer_validation=defer_validation)
+
+    yield from parser.do_parse(root=fetched.filename)
+
+
+def parse_report(parser_class, parse_dir, fetched, output=None,
+                 strict_validation=True, defer_validation=False):
+    """
+        Parse every form in a downloaded report.
+
+        Module level so it can run in the pipeline's worker processes.
+    """
+    return list(iter_report(parser_class, parse_dir, fetched, output=output,
+                            strict_validation=strict_validation,
+                            defer_validation=defer_validation))
+
+
+class FormValidationMixin(object):
+    """
+        With strict_validation (the default, also a scrape argument) every
+        form is validated as it's parsed and the scrape stops at the first
+        failure. Without it forms are validated on validation_workers
+        processes while the scrape carries on, and the failures and the time
+        spent on each schema are logged and written to a report in
+        parse_dir at the end.
+    """
+    strict_validation = True
+    validation_workers = 2
+    # the stage of a non-strict do_scrape
+    validation = None
+
+    def validate_parsed(self, form):
+        # forms parsed in worker processes come back unvalidated
+        if self.validation is not None:
+            self.validation.submit(form)
+
+    def log_validation(self):
+        for title, timing in sorted(self.validation.timings.items()):
+            self.info('validated {n} {t} forms in {s:.2f}s, {f} '
+                      'failed'.format(n=timing.forms, t=title,
+                                      s=timing.seconds, f=timing.failed))
+        for failure in self.validation.failures:
+            self.warning('{d}: {e}'.format(d=failure.document_id,
+                                           e=failure.error))
 
-class UnitedStatesLobbyingDisclosureScraper(BaseDisclosureScraper):
+        mkdir_p(self.parse_dir)
+        filename = os.path.join(self.parse_dir, 'validation-{:%Y%m%dT%H%M%S}'
+                                '.json'.format(datetime.utcnow()))
+        self.validation.write_report(filename)
+        self.info('validation report written to {f}'.format(f=filename))
+
+    def do_scrape(self, **kwargs):
+        self.strict_validation = truthy(kwargs.pop('strict_validation',
+                                                   self.strict_validation))
+        self.validation = None if self.strict_validation else \
+            FormValidation(self.validation_workers)
+        try:
+            return super().do_scrape(**kwargs)
+        finally:
+            if self.validation is not None:
+                self.validation.finish()
+                self.log_validation()
+
+
+class UnitedStatesLobbyingDisclosureScraper(FormValidationMixin,
+                                            PooledSessionMixin,
+                                            BaseDisclosureScraper):
     base_url = 'http://soprweb.senate.gov/index.cfm'
-    start_date = datetime.today()
-    end_date = datetime.today()
+    start_date = None
+    end_date = None
     filing_types = sopr_lobbying_reference.FILING_TYPES
     parse_dir = os.path.join(settings.PARSED_FORM_DIR, 'lobbying', 'sopr')
+    # files or segments, see form_parsing.sinks (None for PARSED_FORM_OUTPUT)
+    form_output = None
+
+    # download/parse pipeline settings, all can be overridden in scrape()
+    fetch_workers = 4
+    parse_workers = None  # one per CPU
+    max_pending = 32
+    requests_per_second = None  # per host, defaults to scrapelib's rate
+
+    # searches return at most this many rows, wider windows get split up
+    max_search_results = 3000
+    search_workers = 4
+
+    # what earlier runs already downloaded, parsed and scraped
+    refresh = False
+    state_db = os.path.join(settings.CACHE_DIR, 'sopr_state.sqlite3')
+    # days back from today to start at when no earlier run has left a mark,
+    # so the first run completes a whole day and the next one resumes after
+    lookback_days = 1
 
     def _build_date_range(self, start_date, end_date):
-        if start_date:
-            self.start_date = datetime.strptime(start_date, '%Y-%m-%d')
+        today = datetime.combine(date.today(), datetime.min.time())
+
         if end_date:
             self.end_date = datetime.strptime(end_date, '%Y-%m-%d')
+        else:
+            self.end_date = today
 
-    def search_filings(self):
-        search_form = {'datePostedStart': datetime.strftime(self.start_date,
-                                                            '%m/%d/%Y'),
-                       'datePostedEnd': datetime.strftime(self.end_date,
-                                                          '%m/%d/%Y')}
-
-        _search_url_rgx = re.compile(r"window\.open\('(.*?)'\)",
-                                     re.IGNORECASE)
-
-        search_params = {'event': 'processSearchCriteria'}
-
-        for filing_type in self.filing_types:
-            _form = search_form.copy()
-            _form['reportType'] = filing_type['code']
-            _form.update(search_params)
-            self.debug('making request with {f}'.format(f=_form))
-            _, response = self.urlretrieve(
-                self.base_url,
-                method='POST',
-                body=_form,
-            )
-            d = etree.fromstring(response.text, parser=HTMLParser())
-            results = d.xpath('//*[@id="searchResults"]/tbody/tr')
+        if start_date:
+            self.start_date = datetime.strptime(start_date, '%Y-%m-%d')
+        else:
+            # pick up the day after the last one every filing type finished
+            mark = None if self.refresh else self.checkpoint.high_water_mark(
+                [ft['code'] for ft in self.filing_types])
+            if mark is None:
+                self.start_date = min(
+                    today - timedelta(days=self.lookback_days),
+                    self.end_date)
+            else:
+                self.start_date = min(
+                    datetime.strptime(mark, '%Y-%m-%d') + timedelta(days=1),
+                    self.end_date)
+
+    def search_results(self, response, chunk_size=65536):
+        """
+            Pull ``SearchResult`` rows out of a search response.
+
+            The raw body is fed to a pull parser in chunks and each row is
+            read in a single pass over its cells and then thrown away, so a
+            3000-row page never exists as a whole tree.
+        """
+        parser = etree.HTMLPullParser(events=('end',), tag='tr',
+                                      encoding=response.encoding)
+        content = memoryview(response.content)
+
+        for offset in range(0, len(content), chunk_size):
+            parser.feed(content[offset:offset + chunk_size].tobytes())
+            yield from self._search_rows(parser.read_events(), response)
+        parser.close()
+        yield from self._search_rows(parser.read_events(), response)
+
+    def _search_rows(self, events, response):
+        for _, result in events:
+            tbody = result.getparent()
+            if tbody is None or tbody.tag != 'tbody' or \
+                    tbody.getparent() is None or \
+                    tbody.getparent().get('id') != 'searchResults':
+                continue
+
+            try:
+                row = self._search_row(result, response)
+            finally:
+                # drop the row and everything before it, we're done with them
+                result.clear()
+                while result.getprevious() is not None:
+                    del tbody[0]
+
+            if row is not None:
+                yield row
+
+    def _search_row(self, result, response):
+        cells = [c.text for c in result if c.tag == 'td']
+        if len(cells) < 5:
+            self.error('element {} has too few cells'.format(
+                etree.tostring(result)))
+            return None
+        registrant_name, client_name, filing_type, _, filing_date = cells[:5]
+
+        try:
+            m = re.search(SEARCH_URL_RGX, result.attrib['onclick'])
+        except KeyError:
+            self.error('element {} has no onclick attribute'.format(
+                etree.tostring(result)))
+            return None
+        try:
+            _doc_path = m.groups()[0]
+        except AttributeError:
+            self.error('no matches found for search_rgx')
+            self.debug('\n{r}\n{a}\n{u}'.format(
+                r=SEARCH_URL_RGX.pattern,
+                a=result.attrib['onclick'],
+                u=response.request.url
+            ))
+            return None
+        _params = dict(parse_qsl(urlparse(_doc_path).query))
+        if not _params:
+            self.error('unable to parse {}'.format(etree.tostring(result)))
+            return None
+
+        return SearchResult(registrant_name, client_name, filing_type,
+                            filing_date, _params)
+
+    def search_window(self, filing_type, start_date, end_date):
+        """
+            Run one search, returning its rows, or None if it hit the result
+            cap and has to be split.
+        """
+        _form = {'datePostedStart': datetime.strftime(start_date, '%m/%d/%Y'),
+                 'datePostedEnd': datetime.strftime(end_date, '%m/%d/%Y'),
+                 'reportType': filing_type['code'],
+                 'event': 'processSearchCriteria'}
+
+        self.debug('making request with {f}'.format(f=_form))
+        self.rate_limiter.wait(self.base_url)
+        _, response = self.urlretrieve(
+            self.base_url,
+            method='POST',
+            body=_form,
+        )
+        results = list(self.search_results(response))
 
-            if len(results) >= 3000:
-                error_msg = "More than 3000 results for params:\n{}".format(
-                            json.dumps(search_params, indent=2))
+        if len(results) >= self.max_search_results:
+            if start_date >= end_date:
+                error_msg = "More than {n} results for params:\n{p}".format(
+                            n=self.max_search_results,
+                            p=json.dumps(_form, indent=2))
                 raise Exception(error_msg)
+            self.info('{n}+ results for {t} {s:%Y-%m-%d} to {e:%Y-%m-%d}, '
+                      'splitting'.format(n=self.max_search_results,
+                                         t=filing_type['code'],
+                                         s=start_date, e=end_date))
+            return None
 
-            # we're going to skip duplicate submissions on the same day
-            results_seen = []
-
-            for result in results:
-                filing_type = result.xpath('td[3]')[0].text
-                registrant_name = result.xpath('td[1]')[0].text
-                client_name = result.xpath('td[2]')[0].text
-                filing_date = result.xpath('td[5]')[0].text
-
-                # this is how we define duplicates
-                result_key = (registrant_name, client_name, filing_type, filing_date)
-                if result_key not in results_seen:
-                    try:
-                        m = re.search(_search_url_rgx, result.attrib['onclick'])
-                    except KeyError:
-                        self.error('element {} has no onclick attribute'.format(
-                            etree.tostring(result)))
-                    try:
-                        _doc_path = m.groups()[0]
-                    except AttributeError:
-                        self.error('no matches found for search_rgx')
-                        self.debug('\n{r}\n{a}\n{u}'.format(
-                            r=_search_url_rgx.pattern,
-                            a=result.attrib['onclick'],
-                            u=response.request.url
-                        ))
-                    _params = dict(parse_qsl(
-                                   urlparse(_doc_path).query))
-                    if _params:
-                        results_seen.append(result_key)
-                        yield _params
-                    else:
-                        self.error('unable to parse {}'.format(
-                            etree.tostring(result)))
-                else:
-                    continue
+        return results
 
-    def parse_filing(self, filename, response):
-        mkdir_p(self.parse_dir)
-
-        self.build_parser()
-        doc_id = os.path.basename(os.path.splitext(filename)[0])
-
-        forms = [f for f in self._parser.do_parse(root=response.content,
-                                                  document_id=doc_id)]
-        if len(forms) > 1:
-            raise Exception('more than one form in a filing?')
-        elif len(forms) == 0:
-            raise Exception('no forms in filing {}'.format(filename))
-        else:
-            return forms[0]
+    def search_filings(self):
+        """
+            Search every filing type over the scrape's date range, yielding a
+            ``SearchResult`` for each filing not seen before, and a
+            ``CompletedWindow`` after the last result of each search.
+
+            Windows that hit the result cap are bisected until every piece is
+            under it. Searches run concurrently, but results still come out
+            ordered by filing type and then date.
+        """
+        with ThreadPoolExecutor(max_workers=self.search_workers) as pool:
+
+            def submit(filing_type, start_date, end_date):
+                return (start_date, end_date,
+                        pool.submit(self.search_window, filing_type,
+                                    start_date, end_date))
+
+            queues = []
+            for filing_type in self.filing_types:
+                if self.refresh:
+                    windows = [(self.start_date, self.end_date)]
+                else:
+                    windows = self.checkpoint.pending_windows(
+                        filing_type['code'], self.start_date, self.end_date)
+                queues.append((filing_type, deque(submit(filing_type, *w)
+                                                  for w in windows)))
+
+            # we're going to skip duplicate submissions on the same day, and
+            # anything an earlier run already scraped
+            results_seen = set()
+
+            for filing_type, queue in queues:
+                while queue:
+                    start_date, end_date, future = queue.popleft()
+                    results = future.result()
+
+                    if results is None:
+                        middle = start_date + (end_date - start_date) / 2
+                        middle = middle.replace(hour=0, minute=0, second=0,
+                                                microsecond=0)
+                        queue.appendleft(submit(filing_type,
+                                                middle + timedelta(days=1),
+                                                end_date))
+                        queue.appendleft(submit(filing_type,
+                                                start_date, middle))
+                        continue
+
+                    for result in results:
+                        # this is how we define duplicates
+                        result_key = result[:4]
+                        if result_key in results_seen:
+                            continue
+                        results_seen.add(result_key)
+                        if not self.refresh and (
+                                result_key in self.seen_results or
+                                self.seen_results.has_filing(
+                                    result.params.get('filingID'))):
+                            continue
+                        yield result
+
+                    yield CompletedWindow(filing_type['code'], start_date,
+                                          end_date)
+
+    def cached_filing_path(self, filing_id):
+        return os.path.join(settings.CACHE_DIR,
+                            '{fn}.html'.format(fn=filing_id))
+
+    def parsed_filing_path(self, filing_id):
+        return self.form_store.location(filing_id)
+
+    def filing_url(self, params):
+        return Request('GET', self.base_url, params=params).prepare().url
+
+    def fetch_filing(self, result):
+        if isinstance(result, CompletedWindow):
+            return None
+
+        params = result.params
+        filing_id = params['filingID']
+        html_path = self.cached_filing_path(filing_id)
+
+        # filings never change once posted (amendments get new ids), so
+        # whatever we already have on disk is as good as a fresh download
+        if not self.refresh:
+            have = self.filing_index.lookup(filing_id, html_path,
+                                            self.parsed_filing_path(filing_id),
+                                            self.form_store.has(filing_id))
+            if have is not None:
+                url = have.url or self.filing_url(params)
+                if have.parsed:
+                    return Parsed(FetchedFiling(html_path, url, None),
+                                  self.form_store.get(filing_id))
+                with open(html_path, 'rb') as f:
+                    return FetchedFiling(html_path, url, f.read())
+
+        self.rate_limiter.wait(self.base_url)
+        filename, response = self.urlretrieve(
+            self.base_url,
+            filename=html_path,
+            method='GET',
+            params=params
+        )
+        return FetchedFiling(filename, response.url, response.content)
 
-    def scrape(self, start_date=None, end_date=None):
+    def scrape(self, start_date=None, end_date=None, fetch_workers=None,
+               parse_workers=None, requests_per_second=None, base_url=None,
+               refresh=False, form_output=None):
         self.authority = self.jurisdiction._sopr
 
         if not os.path.exists(self.parse_dir):
             mkdir_p(self.parse_dir)
+        if form_output is not None:
+            self.form_output = form_output
+
+        self.refresh = truthy(refresh)
+        self.form_store = form_sink(self.parse_dir, self.form_output)
+        self.form_store.compact()
+        self.filing_index = FilingIndex(self.state_db)
+        self.seen_results = SeenResults(self.state_db)
+        self.checkpoint = ScrapeCheckpoint(self.state_db)
 
         self._build_date_range(start_date, end_date)
 
-        for params in self.search_filings():
-            filename, response = self.urlretrieve(
-                self.base_url,
-                filename=os.path.join(
-                    settings.CACHE_DIR,
-                    '{fn}.html'.format(fn=params['filingID'])
-                ),
-                method='GET',
-                params=params
-            )
-            parsed_form = self.parse_filing(filename, response)
-            if canonize_url(response.url) not in settings.url_blacklist:
-                disclosure = self.transform_parse(parsed_form, response)
+        if base_url:
+            self.base_url = base_url
+
+        # throttle with a limiter shared by all of the fetch threads rather
+        # than with scrapelib's per-session one
+        if requests_per_second is None:
+            requests_per_second = self.requests_per_second
+        if requests_per_second is None:
+            requests_per_second = self.requests_per_minute / 60.0
+        self.rate_limiter = HostRateLimiter(float(requests_per_second))
+        self.requests_per_minute = 0
+
+        if parse_workers is None:
+            parse_workers = self.parse_workers
+        fetch_workers = int(fetch_workers or self.fetch_workers)
+
+        # keep a connection open for every thread that can be requesting
+        self.pool_connections(max(self.pool_size,
+                                  fetch_workers + self.search_workers))
+
+        filings = ordered_pipeline(
+            self.search_filings(),
+            self.fetch_filing,
+            partial(parse_filing, self.parser_class, self.parse_dir,
+                    output=self.form_output,
+                    strict_validation=self.strict_validation,
+                    defer_validation=self.validation is not None),
+            fetch_workers=fetch_workers,
+            parse_workers=int(parse_workers)
+            if parse_workers is not None else None,
+            max_pending=self.max_pending
+        )
+
+        yesterday = datetime.combine(date.today(), datetime.min.time()) - \
+            timedelta(days=1)
+
+        for result, fetched, parsed_form in filings:
+            if isinstance(result, CompletedWindow):
+                # everything searched in the window has been yielded by now
+                if result.start_date <= yesterday:
+                    self.checkpoint.complete(result.filing_type,
+                                             result.start_date,
+                                             min(result.end_date, yesterday))
+                continue
+
+            filing_id = result.params['filingID']
+            if fetched.content is not None:
+                self.validate_parsed(parsed_form)
+                self.filing_index.add(filing_id, fetched.url,
+                                      fetched.filename,
+                                      sha1_bytes(fetched.content),
+                                      self.parsed_filing_path(filing_id))
+            if canonize_url(fetched.url) not in settings.url_blacklist:
+                disclosure = self.transform_parse(parsed_form, fetched)
                 yield disclosure
+            self.seen_results.add(result[:4], filing_id)
 
 
 class UnitedStatesLobbyingRegistrationDisclosureScraper(
         UnitedStatesLobbyingDisclosureScraper):
     filing_types = [ft for ft in sopr_lobbying_reference.FILING_TYPES
                     if ft['action'] == 'registration']
-
-    def build_parser(self):
-        self._parser = UnitedStatesLobbyingRegistrationParser(
-            self.jurisdiction,
-            self.parse_dir,
-            strict_validation=True
-        )
+    parser_class = UnitedStatesLobbyingRegistrationParser
 
     def transform_parse(self, parsed_form, response):
 
@@ -929,36 +1258,48 @@ class UnitedStatesLobbyingRegistrationDisclosureScraper(
         yield _disclosure
 
 
-class UnitedStatesHousePostEmploymentScraper(BaseDisclosureScraper):
+class UnitedStatesHousePostEmploymentScraper(FormValidationMixin,
+                                             ConditionalGetMixin,
+                                             PooledSessionMixin,
+                                             BaseDisclosureScraper):
     parse_dir = os.path.join(settings.PARSED_FORM_DIR, 'post_employment',
                              'house')
+    # files or segments, see form_parsing.sinks (None for PARSED_FORM_OUTPUT);
+    # a report is tens of thousands of forms, so segments suit it better
+    form_output = None
 
     def build_parser(self):
         self._parser = UnitedStatesHousePostEmploymentParser(
             self.jurisdiction,
             self.parse_dir,
-            strict_validation=True
+            strict_validation=self.strict_validation,
+            output=self.form_output,
+            validation=self.validation
         )
 
-    def scrape(self):
+    def scrape(self, form_output=None):
         self.authority = self.jurisdiction._house_clerk
 
         if not os.path.exists(self.parse_dir):
             mkdir_p(self.parse_dir)
+        if form_output is not None:
+            self.form_output = form_output
 
-        filename, response = self.urlretrieve(
+        filename, response = self.retrieve_if_modified(
             'http://clerk.house.gov/public_disc/post-employment/PostEmployment.zip',
             filename=os.path.join(settings.CACHE_DIR, 'PostEmployment.zip')
         )
+        if response is None:
+            return
 
-        zip_file = ZipFile(BytesIO(response.content))
-
-        post_employment_xml = BytesIO(zip_file.read('PostEmployment.xml'))
-
+        form_sink(self.parse_dir, self.form_output).compact()
         self.build_parser()
 
-        for parsed_form in self._parser.do_parse(root=post_employment_xml):
-            yield from self.transform_parse(parsed_form, response)
+        # the parser streams the member straight out of the archive
+        with ZipFile(filename) as zip_file, \
+                zip_file.open('PostEmployment.xml') as post_employment_xml:
+            for parsed_form in self._parser.do_parse(root=post_employment_xml):
+                yield from self.transform_parse(parsed_form, response)
 
     def transform_parse(self, parsed_form, response):
         _source = {
@@ -1053,45 +1394,114 @@ class UnitedStatesHousePostEmploymentScraper(BaseDisclosureScraper):
         yield _disclosure
 
 
-class UnitedStatesSenatePostEmploymentScraper(BaseDisclosureScraper):
+class UnitedStatesSenatePostEmploymentScraper(FormValidationMixin,
+                                              ConditionalGetMixin,
+                                              PooledSessionMixin,
+                                              BaseDisclosureScraper):
     parse_dir = os.path.join(settings.PARSED_FORM_DIR, 'post_employment',
                              'senate')
+    # files or segments, see form_parsing.sinks (None for PARSED_FORM_OUTPUT);
+    # a report is thousands of forms, so segments suit it better
+    form_output = None
+
+    parser_class = UnitedStatesSenatePostEmploymentParser
+
+    first_year = 2008
+    fetch_workers = 4
+    parse_workers = None  # one per CPU
+    # reports fetched or parsed ahead of the one being yielded, each a year
+    # of forms held in memory
+    max_pending = 2
+
+    current_url = 'http://www.senate.gov/legislative/termination_disclosure/report{year}.xml'
+    archive_url = 'http://www.senate.gov/legislative/termination_disclosure/{year}/report{year}.xml'
+
+    def parse_years(self, years):
+        """
+            Turn a ``years`` argument (``2014``, ``2010-2014``,
+            ``2010,2012`` or ``all``) into a sorted list of years.
+        """
+        current_year = datetime.today().year
 
-    def build_parser(self):
-        self._parser = UnitedStatesSenatePostEmploymentParser(
-            self.jurisdiction,
-            self.parse_dir,
-            strict_validation=True
-        )
+        if years is None:
+            return [current_year]
+        if str(years).strip().lower() == 'all':
+            return list(range(self.first_year, current_year + 1))
+
+        selected = set()
+        for part in str(years).split(','):
+            if '-' in part:
+                first, last = part.split('-', 1)
+                selected.update(range(int(first), int(last) + 1))
+            else:
+                selected.add(int(part))
+        return sorted(selected)
 
-    def scrape(self, year=None):
+    def fetch_report(self, year):
+        if year == datetime.today().year:
+            url = self.current_url.format(year=year)
+        else:
+            url = self.archive_url.format(year=year)
+
+        try:
+            filename, response = self.retrieve_if_modified(
+                url,
+                filename=os.path.join(settings.CACHE_DIR,
+                                      'report{}.xml'.format(year))
+            )
+        except scrapelib.HTTPError as e:
+            if e.response.status_code != 404:
+                raise
+            self.warning('no report for {y} at {u}'.format(y=year, u=url))
+            return None
+        if response is None:
+            return None
+
+        return FetchedFiling(filename, response.url, None)
+
+    def scrape(self, year=None, years=None, fetch_workers=None,
+               parse_workers=None, form_output=None):
         self.authority = self.jurisdiction._house_clerk
 
         if not os.path.exists(self.parse_dir):
             mkdir_p(self.parse_dir)
-
-        current_year = datetime.today().year
-
-        if year is None:
-            year = current_year
-
-        if year == current_year:
-            url_template = 'http://www.senate.gov/legislative/termination_disclosure/report{year}.xml'
-        else:
-            url_template = 'http://www.senate.gov/legislative/termination_disclosure/{year}/report{year}.xml'
-
-        filename, response = self.urlretrieve(
-            url_template.format(year=year),
-            filename=os.path.join(settings.CACHE_DIR,
-                                  'report{}.xml'.format(year))
+        if form_output is not None:
+            self.form_output = form_output
+        form_sink(self.parse_dir, self.form_output).compact()
+
+        years = self.parse_years(years if years is not None else year)
+
+        if parse_workers is None:
+            # not worth starting processes for a single report
+            parse_workers = 0 if len(years) == 1 else self.parse_workers
+        if parse_workers is not None:
+            parse_workers = int(parse_workers)
+
+        # reports are downloaded on threads and parsed in worker processes,
+        # but come back in year order. Parsed here instead, a report's forms
+        # are read as they're yielded rather than all at once
+        reports = ordered_pipeline(
+            years,
+            self.fetch_report,
+            partial(iter_report if parse_workers == 0 else parse_report,
+                    self.parser_class, self.parse_dir,
+                    output=self.form_output,
+                    strict_validation=self.strict_validation,
+                    defer_validation=self.validation is not None),
+            fetch_workers=int(fetch_workers or self.fetch_workers),
+            parse_workers=parse_workers,
+            max_pending=self.max_pending
         )
 
-        post_employment_xml = BytesIO(response.content)
-
-        self.build_parser()
-
-        for parsed_form in self._parser.do_parse(root=post_employment_xml):
-            yield from self.transform_parse(parsed_form, response)
+        for year, fetched, parsed_forms in reports:
+            if fetched is None:
+                continue
+            forms = 0
+            for parsed_form in parsed_forms:
+                forms += 1
+                self.validate_parsed(parsed_form)
+                yield from self.transform_parse(parsed_form, fetched)
+            self.info('{n} forms in the {y} report'.format(n=forms, y=year))
 
     def transform_parse(self, parsed_form, response):
         _source = {
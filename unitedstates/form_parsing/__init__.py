@@ -2,8 +2,8 @@ import os
 import logging
 import json
 import datetime
+import itertools
 
-from copy import deepcopy
 from collections import OrderedDict
 from collections import defaultdict
 
@@ -11,8 +11,9 @@ from lxml import etree
 
 import pupa.utils
 
-from validictory import ValidationError
-
+from .compiler import get_plan, xpath_cache, ArrayStep, ObjectStep
+from .sinks import form_sink
+from .validation import validate_form
 from .parse_schema import sopr_html, sopr_xml, house_xml
 
 
@@ -36,14 +37,7 @@ class Form(object):
         pass
 
     def validate(self):
-        validator = pupa.utils.DatetimeValidator(required_by_default=False)
-
-        try:
-            validator.validate(self.as_dict(), self.schema)
-        except ValidationError as ve:
-            raise ValidationError('validation of {} {} failed: {}'.format(
-                self.__class__.__name__, self._form_jurisdiction, ve)
-            )
+        validate_form(self)
 
     def __getitem__(self, key):
         return self.as_dict()[key]
@@ -62,24 +56,72 @@ class Form(object):
         return self._id
 
 
+# record full path traces for one in every N documents (off when unset)
+TRACE_EVERY = int(os.environ.get('PARSER_TRACE_EVERY', 0)) or None
+
+# documents parsed in this process, counted across parsers since callers
+# usually make a new one for every document
+_documents_seen = itertools.count(1)
+
+
 class Parser(object):
 
-    def __init__(self, jurisdiction, datadir, strict_validation=True):
+    def __init__(self, jurisdiction, datadir, strict_validation=True,
+                 trace_every=TRACE_EVERY, output=None, validation=None,
+                 defer_validation=False):
         self.jurisdiction = jurisdiction
         self.datadir = datadir
-        self.strict_validation = True
+
+        # strict: validate every form as it's saved and raise on the first
+        # failure. Otherwise forms go to the validation stage if there is
+        # one (see validation.FormValidation), are left to the caller with
+        # defer_validation, or are validated here with failures logged
+        self.strict_validation = strict_validation
+        self.validation = validation
+        self.defer_validation = defer_validation
+
+        # where forms are written, see sinks.form_sink()
+        self.sink = form_sink(datadir, output)
+
+        # path tracing, see begin_trace()
+        self.trace_every = trace_every
+        self.document_number = None
+        self._trace = None
 
         # logging convenience methods
         self.logger = logging.getLogger("parser")
+        self.trace_logger = logging.getLogger("parser.trace")
         self.info = self.logger.info
         self.debug = self.logger.debug
         self.warning = self.logger.warning
         self.error = self.logger.error
         self.critical = self.logger.critical
 
+    def debug_enabled(self):
+        return self.logger.isEnabledFor(logging.DEBUG)
+
+    def begin_trace(self):
+        """
+            Count a new document and start collecting a path trace for it if
+            it falls in the sample.
+        """
+        self.document_number = next(_documents_seen)
+        if self.trace_every and \
+                (self.document_number - 1) % self.trace_every == 0:
+            self._trace = []
+        else:
+            self._trace = None
+
+    def end_trace(self, document_name):
+        if self._trace is not None:
+            self.trace_logger.info('path trace for document %d (%s):\n    %s',
+                                   self.document_number, document_name,
+                                   '\n    '.join(self._trace))
+            self._trace = None
+
     def save_object(self, obj):
         """
-            Save object to disk as JSON.
+            Save object to the parser's sink as JSON.
 
             Generally shouldn't be called directly.
         """
@@ -89,22 +131,30 @@ class Parser(object):
         filename = '{id}.json'.format(id=obj._id).replace('/', '-')
 
         self.info('save %s %s as %s', obj._type, obj, filename)
-        self.debug(json.dumps(OrderedDict(sorted(obj.as_dict().items())),
-                              cls=pupa.utils.JSONEncoderPlus, indent=4,
-                              separators=(',', ': ')))
+        if self.debug_enabled():
+            self.debug(json.dumps(OrderedDict(sorted(obj.as_dict().items())),
+                                  cls=pupa.utils.JSONEncoderPlus, indent=4,
+                                  separators=(',', ': ')))
 
         self.output_names[obj._type].add(filename)
 
-        with open(os.path.join(self.datadir, filename), 'w') as f:
-            json.dump(obj.as_dict(), f, cls=pupa.utils.JSONEncoderPlus)
+        self.sink.write(obj._id, obj.as_dict())
 
         # validate after writing, allows for inspection on failure
-        try:
-            obj.validate()
-        except ValueError as ve:
-            self.warning(ve)
-            if self.strict_validation:
+        if self.strict_validation:
+            try:
+                obj.validate()
+            except ValueError as ve:
+                self.warning(ve)
+                self.sink.flush()
                 raise ve
+        elif self.validation is not None:
+            self.validation.submit(obj)
+        elif not self.defer_validation:
+            try:
+                obj.validate()
+            except ValueError as ve:
+                self.warning(ve)
 
     def do_parse(self, **kwargs):
         if not kwargs.get('root', False):
@@ -114,7 +164,7 @@ class Parser(object):
         self.output_names = defaultdict(set)
         record['start'] = datetime.datetime.utcnow()
         for obj in self.parse(**kwargs) or []:
-            self.debug('{o}'.format(o=obj))
+            self.debug('%s', obj)
             if hasattr(obj, '__iter__'):
                 for iterobj in obj:
                     self.save_object(iterobj)
@@ -136,9 +186,13 @@ class Parser(object):
 
 class SchemaParser(Parser):
 
-    def __init__(self, jurisdiction, data_dir, strict_validation=True):
-        super().__init__(jurisdiction, data_dir, strict_validation)
+    def __init__(self, jurisdiction, data_dir, strict_validation=True,
+                 trace_every=TRACE_EVERY, output=None, validation=None,
+                 defer_validation=False):
+        super().__init__(jurisdiction, data_dir, strict_validation,
+                         trace_every, output, validation, defer_validation)
         self.schema = self.form_model.schema
+        self.plan = get_plan(self.schema)
 
     def extract_location(self, container, path, prop, expect_array=False,
                          missing_okay=False):
@@ -146,107 +200,83 @@ class SchemaParser(Parser):
                                   ' must provide a method for extracting' +
                                   ' from path location')
 
-    def parse_schema_node(self, schema_node, container, prop_name):
+    def parse_schema_node(self, step, container):
         # initial container is just the root node of the lxml etree
-        if schema_node['type'] == 'array':
-            return self.parse_array(
-                deepcopy(schema_node),
-                container,
-                prop_name
-            )
+        if isinstance(step, ArrayStep):
+            return self.parse_array(step, container)
 
-        elif schema_node['type'] == 'object':
-            result = {}
-            for subprop, subnode in schema_node['properties'].items():
-                result[subprop] = self.parse_schema_node(
-                    deepcopy(subnode),
-                    container,
-                    subprop
-                )
-            return result
+        elif isinstance(step, ObjectStep):
+            return {substep.name: self.parse_schema_node(substep, container)
+                    for substep in step.steps}
         else:
-            _parse_fct = schema_node['parser']
             e = self.extract_location(
                 container,
-                schema_node['path'],
-                prop_name,
-                missing_okay=schema_node.get('missing', False)
+                step.xpath,
+                step.name,
+                missing_okay=step.missing
             )
 
             if e is not None:
-                if e in ([], ''):
-                    return _parse_fct(e)
-                return _parse_fct(e)
+                return step.parser(e)
             else:
                 # TODO: should this return null if blank=True?
                 return None
 
-    def parse_array(self, schema_node, container, prop):
+    def parse_array(self, step, container):
         result_array = []
 
         array_container = self.extract_location(
             container,
-            schema_node['path'],
-            prop,
-            missing_okay=schema_node.get('missing', False)
+            step.xpath,
+            step.name,
+            missing_okay=step.missing
         )
 
-        items_schema = schema_node['items']
-        even_odd = schema_node.get('even_odd', False)
-
         items = self.extract_location(
             array_container,
-            items_schema['path'],
-            prop,
+            step.items_xpath,
+            step.name,
             expect_array=True,
-            missing_okay=items_schema.get('missing', False)
+            missing_okay=step.items_missing
         )
 
-        if even_odd:
+        if step.even_odd:
             evens = items[::2]
             odds = items[1::2]
-            all_props = items_schema['properties']
-            even_props = [(p, s) for p, s in all_props.items()
-                          if s['even_odd'] == 'even']
-            odd_props = [(p, s) for p, s in all_props.items()
-                         if s['even_odd'] == 'odd']
             for even, odd in zip(evens, odds):
                 result = {}
-                for prop_name, prop_node in even_props:
-                    result.update({prop_name: self.parse_schema_node(
-                        prop_node, even, prop_name)})
-                for prop_name, prop_node in odd_props:
-                    result.update({prop_name: self.parse_schema_node(
-                        prop_node, odd, prop_name)})
+                for substep in step.even_steps:
+                    result[substep.name] = self.parse_schema_node(substep,
+                                                                  even)
+                for substep in step.odd_steps:
+                    result[substep.name] = self.parse_schema_node(substep,
+                                                                  odd)
                 result_array.append(result)
         else:
             for item in items:
-                result = self.parse_schema_node(items_schema, item, prop)
+                result = self.parse_schema_node(step.item, item)
                 if result:
                     result_array.append(result)
         return result_array
 
     def parse(self, root=None, **kwargs):
-        if self.schema['type'] == 'object':
-            form = self.form_model(**kwargs)
-            for prop, schema_node in self.schema['properties'].items():
-                if prop == "_meta":
-                    continue
-                else:
-                    form._record[prop] = self.parse_schema_node(schema_node,
-                                                                root,
-                                                                prop)
-            yield form
-        else:
-            raise NotImplementedError('Sorry, only implemented for schemas'
-                                      'where top level is object')
+        form = self.form_model(**kwargs)
+        self.begin_trace()
+        for step in self.plan.steps:
+            form._record[step.name] = self.parse_schema_node(step, root)
+        self.end_trace(kwargs.get('document_id', self.plan.title))
+        yield form
 
 
 class LXMLSchemaParser(SchemaParser):
 
     def extract_location(self, container, path, prop, expect_array=False,
                          missing_okay=False):
-        found = container.xpath(path)
+        # path is normally a compiled step from the plan, but plain strings
+        # are accepted too and go through the shared evaluator cache
+        if isinstance(path, str):
+            path = xpath_cache.get(path)
+        found = path(container)
         if not found:
             if missing_okay:
                 if expect_array:
@@ -261,19 +291,29 @@ class LXMLSchemaParser(SchemaParser):
                             "path: {p}\n"]
                            ).format(n=prop,
                                     c=container_loc,
-                                    p=path)
+                                    p=path.path)
                            )
         else:
-            self.debug("\n    ".join(
-                       ["match found for property {n}",
-                        "container: {c}",
-                        "path: {p}\n",
-                        "found: {f}"]
-                       ).format(n=prop,
-                                c=container.getroottree().getpath(container),
-                                p=path,
-                                f=found)
-                       )
+            # building the container path is costly, only do it when the
+            # result is going to be logged or traced
+            tracing = self._trace is not None
+            debugging = self.debug_enabled()
+            if tracing or debugging:
+                container_loc = container.getroottree().getpath(container)
+                if tracing:
+                    self._trace.append('{n}: {c} -> {p} ({k} found)'.format(
+                        n=prop, c=container_loc, p=path.path, k=len(found)))
+                if debugging:
+                    self.debug("\n    ".join(
+                               ["match found for property {n}",
+                                "container: {c}",
+                                "path: {p}\n",
+                                "found: {f}"]
+                               ).format(n=prop,
+                                        c=container_loc,
+                                        p=path.path,
+                                        f=found)
+                               )
 
             if expect_array:
                 return found
@@ -285,7 +325,7 @@ class LXMLSchemaParser(SchemaParser):
                                   "path: {p}\n"]
                                  ).format(n=prop,
                                           c=container.getroottree().getpath(container),
-                                          p=path)
+                                          p=path.path)
                                  )
                     return found[0]
                 else:
@@ -305,15 +345,45 @@ class HTMLSchemaParser(LXMLSchemaParser):
 
 
 class XMLSchemaParser(LXMLSchemaParser):
+    # stream documents with iterparse, parsing each record as it is read,
+    # rather than building the whole tree and searching it with object_path;
+    # only possible when object_path is a plain path of element names
+    streaming = True
 
     def parse(self, **kwargs):
-        etree_root = etree.parse(kwargs['root'])
+        if self.streaming and self.plan.record_path is not None:
+            yield from self.iterparse(kwargs['root'])
+            return
 
-        object_path = self.form_model.schema['object_path']
+        etree_root = etree.parse(kwargs['root'])
 
-        for object_root in etree_root.xpath(object_path):
+        for object_root in self.plan.object_xpath(etree_root):
             yield from super().parse(root=object_root)
 
+    def is_record(self, element):
+        """
+            Whether ``element`` sits at the end of the schema's object_path.
+        """
+        for tag in reversed(self.plan.record_path):
+            if element is None or element.tag != tag:
+                return False
+            element = element.getparent()
+        return element is None
+
+    def iterparse(self, source):
+        for _, element in etree.iterparse(source, events=('end',),
+                                          tag=self.plan.record_path[-1]):
+            if not self.is_record(element):
+                continue
+
+            yield from super().parse(root=element)
+
+            # the forms have been handled by the time we get back here, so
+            # the element and the ones before it can go
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
 
 class LobbyingRegistrationForm(Form):
 
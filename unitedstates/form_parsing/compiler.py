@@ -0,0 +1,148 @@
+"""
+    Compile form schemas into extraction plans.
+
+    A plan is built once per schema per process and holds everything a
+    ``SchemaParser`` needs to pull a form out of a document: precompiled
+    XPath evaluators, the parser callable for each field and the key its
+    value is stored under. Running a plan never copies or mutates the schema.
+"""
+import re
+
+from collections import namedtuple
+
+from lxml import etree
+
+
+FieldStep = namedtuple('FieldStep', ['name', 'xpath', 'parser', 'missing'])
+
+ObjectStep = namedtuple('ObjectStep', ['name', 'steps'])
+
+ArrayStep = namedtuple('ArrayStep', ['name', 'xpath', 'missing',
+                                     'items_xpath', 'items_missing',
+                                     'even_odd', 'item',
+                                     'even_steps', 'odd_steps'])
+
+Plan = namedtuple('Plan', ['title', 'steps', 'object_xpath', 'record_path'])
+
+# object paths made only of element names from the root can be streamed
+STREAMABLE_PATH = re.compile(r'^(?:/[A-Za-z_][\w.-]*)+$')
+
+# id(schema) -> (schema, plan); the schema is kept so its id can't be reused
+_plans = {}
+
+
+class XPathCache(object):
+    """
+        Process-wide store of compiled XPath evaluators, keyed by path string.
+
+        The same relative paths (``td[2]/div`` and friends) turn up all over
+        the schemas, so each distinct expression is only compiled once.
+
+        ``hits`` and ``misses`` count lookups, which happen while plans are
+        compiled and for plain path strings given to extract_location.
+        Plans keep their evaluators, so parsing with an already compiled
+        plan doesn't touch the counts; they describe compilation, not the
+        XPath work of any one document.
+    """
+
+    def __init__(self):
+        self._evaluators = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._evaluators)
+
+    def __contains__(self, path):
+        return path in self._evaluators
+
+    def get(self, path):
+        try:
+            evaluator = self._evaluators[path]
+        except KeyError:
+            evaluator = self._evaluators[path] = etree.XPath(path)
+            self.misses += 1
+        else:
+            self.hits += 1
+        return evaluator
+
+    def clear(self):
+        self._evaluators.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+xpath_cache = XPathCache()
+
+
+def compile_node(schema_node, name):
+    if schema_node['type'] == 'array':
+        return compile_array(schema_node, name)
+    elif schema_node['type'] == 'object':
+        return ObjectStep(name, tuple(
+            compile_node(subnode, subprop)
+            for subprop, subnode in schema_node['properties'].items()
+        ))
+    else:
+        return FieldStep(name,
+                         xpath_cache.get(schema_node['path']),
+                         schema_node['parser'],
+                         schema_node.get('missing', False))
+
+
+def compile_array(schema_node, name):
+    items_schema = schema_node['items']
+    even_odd = bool(schema_node.get('even_odd', False))
+
+    if even_odd:
+        all_props = items_schema['properties']
+        even_steps = tuple(compile_node(s, p) for p, s in all_props.items()
+                           if s['even_odd'] == 'even')
+        odd_steps = tuple(compile_node(s, p) for p, s in all_props.items()
+                          if s['even_odd'] == 'odd')
+        item = None
+    else:
+        even_steps = odd_steps = ()
+        item = compile_node(items_schema, name)
+
+    return ArrayStep(name=name,
+                     xpath=xpath_cache.get(schema_node['path']),
+                     missing=schema_node.get('missing', False),
+                     items_xpath=xpath_cache.get(items_schema['path']),
+                     items_missing=items_schema.get('missing', False),
+                     even_odd=even_odd,
+                     item=item,
+                     even_steps=even_steps,
+                     odd_steps=odd_steps)
+
+
+def compile_schema(schema):
+    if schema['type'] != 'object':
+        raise NotImplementedError('Sorry, only implemented for schemas'
+                                  'where top level is object')
+
+    steps = tuple(compile_node(schema_node, prop)
+                  for prop, schema_node in schema['properties'].items()
+                  if prop != '_meta')
+
+    object_path = schema.get('object_path')
+    object_xpath = xpath_cache.get(object_path) if object_path else None
+
+    if object_path and STREAMABLE_PATH.match(object_path):
+        record_path = tuple(object_path.strip('/').split('/'))
+    else:
+        record_path = None
+
+    return Plan(schema['title'], steps, object_xpath, record_path)
+
+
+def get_plan(schema):
+    """
+        Return the plan for ``schema``, compiling it on first use.
+    """
+    try:
+        return _plans[id(schema)][1]
+    except KeyError:
+        plan = compile_schema(schema)
+        _plans[id(schema)] = (schema, plan)
+        return plan
@@ -0,0 +1,251 @@
+"""
+    Where parsers write the forms they parse.
+
+    ``FormFiles`` is the original layout, one JSON file per form.
+    ``FormSegments`` appends forms to JSON Lines segment files instead, a
+    batch at a time with an fsync per batch, and records where each one went
+    in a SQLite index so a single form can still be fetched by document id.
+    Forms written again leave their old copies behind, so scrapers compact
+    the segments before each run.
+
+    ``form_sink`` picks one by name, ``files`` or ``segments``, defaulting to
+    the PARSED_FORM_OUTPUT environment variable.
+"""
+import os
+import json
+import time
+import threading
+
+from multiprocessing.util import Finalize
+
+import pupa.utils
+
+from ..cache import SQLiteStore
+from .utils import mkdir_p
+
+
+FORM_OUTPUT = os.environ.get('PARSED_FORM_OUTPUT', 'files')
+
+
+class FormFiles(object):
+
+    def __init__(self, datadir):
+        self.datadir = datadir
+
+    def location(self, document_id):
+        filename = '{id}.json'.format(id=document_id).replace('/', '-')
+        return os.path.join(self.datadir, filename)
+
+    def write(self, document_id, record):
+        with open(self.location(document_id), 'w') as f:
+            json.dump(record, f, cls=pupa.utils.JSONEncoderPlus)
+
+    def flush(self):
+        pass
+
+    def compact(self):
+        pass
+
+    def has(self, document_id):
+        return os.path.exists(self.location(document_id))
+
+    def get(self, document_id):
+        try:
+            with open(self.location(document_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+
+class SegmentIndex(SQLiteStore):
+    """
+        The segment, offset and length of the latest copy of every form.
+    """
+    schema = '''
+        CREATE TABLE IF NOT EXISTS forms (
+            document_id TEXT PRIMARY KEY,
+            segment TEXT NOT NULL,
+            offset INTEGER NOT NULL,
+            length INTEGER NOT NULL
+        );
+    '''
+
+    def get(self, document_id):
+        rows = self.execute('SELECT segment, offset, length FROM forms '
+                            'WHERE document_id = ?', (document_id,))
+        return rows[0] if rows else None
+
+    def add(self, rows):
+        self.executemany('INSERT OR REPLACE INTO forms '
+                         '(document_id, segment, offset, length) '
+                         'VALUES (?, ?, ?, ?)', rows)
+
+    def live_bytes(self):
+        """
+            ``{segment: bytes}`` of the forms each segment still holds the
+            latest copy of.
+        """
+        return dict(self.execute('SELECT segment, SUM(length) FROM forms '
+                                 'GROUP BY segment'))
+
+    def in_segment(self, segment):
+        return self.execute('SELECT document_id, offset, length FROM forms '
+                            'WHERE segment = ? ORDER BY offset', (segment,))
+
+
+class FormSegments(object):
+    """
+        Forms appended as JSON Lines to segment files in ``datadir``.
+
+        Every process writes its own segments, starting a new one once the
+        current one passes ``segment_bytes``. Forms are buffered and written
+        ``batch_size`` at a time; a batch is fsynced before it's added to
+        the index, so the index never points at data that isn't on disk.
+        Whatever is still buffered is written when the process exits.
+    """
+    batch_size = 500
+    segment_bytes = 64 * 1024 * 1024
+    # compact() rewrites a segment once less than this share of it is live
+    min_live_ratio = 0.5
+
+    def __init__(self, datadir):
+        mkdir_p(datadir)
+        self.datadir = datadir
+        self.index = SegmentIndex(os.path.join(datadir, 'forms.sqlite3'))
+        self._lock = threading.Lock()
+        self._pending = []
+        self._segment = None
+        self._segment_name = None
+        self._segment_size = 0
+        self._segments_opened = 0
+        Finalize(None, self.close, exitpriority=10)
+
+    def location(self, document_id):
+        """
+            None: a form in a segment has no file of its own, and may still
+            be buffered. Use get() to read it back.
+        """
+        return None
+
+    def write(self, document_id, record):
+        line = json.dumps(record, cls=pupa.utils.JSONEncoderPlus) + '\n'
+        with self._lock:
+            self._pending.append((document_id, line.encode('utf-8')))
+            if len(self._pending) >= self.batch_size:
+                self._write_batch()
+
+    def flush(self):
+        with self._lock:
+            if self._pending:
+                self._write_batch()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if self._segment is not None:
+                self._segment.close()
+                self._segment = None
+
+    def compact(self):
+        """
+            Delete the segments no form points at any more, and copy the
+            live forms out of the ones that are mostly dead copies so they
+            can go too. Only safe while no other process is writing to
+            ``datadir``, i.e. before a scrape starts its workers.
+        """
+        # start a new segment afterwards, so the current one can go too
+        self.close()
+        live = self.index.live_bytes()
+        with self._lock:
+            for name in sorted(os.listdir(self.datadir)):
+                if not (name.startswith('forms-') and name.endswith('.jsonl')):
+                    continue
+                filename = os.path.join(self.datadir, name)
+                live_bytes = live.get(name, 0)
+                if live_bytes and \
+                        live_bytes >= os.path.getsize(filename) * \
+                        self.min_live_ratio:
+                    continue
+                if live_bytes:
+                    with open(filename, 'rb') as f:
+                        for document_id, offset, length in \
+                                self.index.in_segment(name):
+                            f.seek(offset)
+                            self._pending.append((document_id, f.read(length)))
+                            if len(self._pending) >= self.batch_size:
+                                self._write_batch()
+                    if self._pending:
+                        self._write_batch()
+                # the index points at the copies by now
+                os.remove(filename)
+
+    def _write_batch(self):
+        if self._segment is None or \
+                self._segment_size >= self.segment_bytes:
+            if self._segment is not None:
+                self._segment.close()
+            self._segments_opened += 1
+            self._segment_name = 'forms-{t}-{p}-{n}.jsonl'.format(
+                t=time.strftime('%Y%m%dT%H%M%S'), p=os.getpid(),
+                n=self._segments_opened)
+            self._segment = open(os.path.join(self.datadir,
+                                              self._segment_name), 'ab')
+            self._segment_size = self._segment.tell()
+
+        rows = []
+        offset = self._segment_size
+        for document_id, data in self._pending:
+            rows.append((document_id, self._segment_name, offset, len(data)))
+            offset += len(data)
+
+        self._segment.write(b''.join(data for _, data in self._pending))
+        self._segment.flush()
+        os.fsync(self._segment.fileno())
+        self._segment_size = offset
+        self.index.add(rows)
+        self._pending = []
+
+    def has(self, document_id):
+        with self._lock:
+            if any(pending_id == document_id
+                   for pending_id, _ in self._pending):
+                return True
+        return self.index.get(document_id) is not None
+
+    def get(self, document_id):
+        """
+            The form saved as ``document_id``, or None if there isn't one.
+        """
+        with self._lock:
+            for pending_id, data in reversed(self._pending):
+                if pending_id == document_id:
+                    return json.loads(data.decode('utf-8'))
+
+        found = self.index.get(document_id)
+        if found is None:
+            return None
+        segment, offset, length = found
+        with open(os.path.join(self.datadir, segment), 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.read(length).decode('utf-8'))
+
+
+# one FormSegments per directory and process, so the parsers made for each
+# document in a worker process share its batches
+_segment_sinks = {}
+_segment_sinks_lock = threading.Lock()
+
+
+def form_sink(datadir, output=None):
+    output = output or FORM_OUTPUT
+    if output == 'files':
+        return FormFiles(datadir)
+    if output == 'segments':
+        key = (os.getpid(), os.path.abspath(datadir))
+        with _segment_sinks_lock:
+            sink = _segment_sinks.get(key)
+            if sink is None:
+                sink = _segment_sinks[key] = FormSegments(datadir)
+        return sink
+    raise ValueError('unknown form output {!r}, expected files or '
+                     'segments'.format(output))
@@ -1,14 +1,17 @@
 from datetime import datetime
-import locale
 import re
-from functools import reduce
+import sys
+from functools import lru_cache, reduce
 
 REPLACE_MAP = {u'&#160;': u'',
                u'\xa0': u'',
                u'\u200b': u'',
                u'&nbsp;': u''}
 
-locale.setlocale(locale.LC_ALL, 'en_US.UTF-8')
+# text this short (states, countries, blanks, ...) repeats endlessly across
+# filings, so it's normalized once and kept interned
+SHORT_TEXT = 64
+TEXT_CACHE_SIZE = 16384
 
 DATE_FORMATS = ['%m/%d/%Y',
                 '%m/%d/%Y %I:%M:%S %p',
@@ -33,6 +36,33 @@ LEAP_DAY_CHECKS = [
 ]
 
 
+# the shapes of the strings DATE_FORMATS parse, in the same order, and the
+# fields they hold, so a string can be sent straight to the right format
+DATE_SHAPES = [
+    (r'([0-9]{1,2})/([0-9]{1,2})/([0-9]{4})', 'mdY'),
+    (r'([0-9]{1,2})/([0-9]{1,2})/([0-9]{4}) '
+     r'([0-9]{1,2}):([0-9]{2}):([0-9]{2}) ([AaPp][Mm])', 'mdYIMSp'),
+    (r'([0-9]{1,2})/([0-9]{1,2})/([0-9]{2})', 'mdy'),
+    (r'([0-9]{4})/([0-9]{1,2})/([0-9]{1,2})', 'Ymd'),
+    (r'([0-9]{1,2})-([0-9]{1,2})-([0-9]{4})', 'mdY'),
+    (r'([0-9]{1,2})-([0-9]{1,2})-([0-9]{2})', 'mdy'),
+    (r'([0-9]{1,2})\.([0-9]{1,2})\.([0-9]{4})', 'mdY'),
+]
+
+DATE_SHAPE = re.compile('|'.join(r'({})\Z'.format(pattern)
+                                 for pattern, fields in DATE_SHAPES))
+
+# the fields of each shape, by the number of the group wrapping it
+SHAPE_FIELDS = {}
+_group = 1
+for _pattern, _fields in DATE_SHAPES:
+    SHAPE_FIELDS[_group] = (_fields, range(_group + 1,
+                                           _group + 1 + len(_fields)))
+    _group += 1 + len(_fields)
+
+DATE_CACHE_SIZE = 4096
+
+
 def get_key(my_dict, key):
     return reduce(dict.get, key.split("."), my_dict)
 
@@ -62,69 +92,155 @@ def checkbox_boolean(e):
     return 'checked' in e.attrib
 
 
-def clean_text(e):
-    s = e.text or ''
-    s = s.strip()
+def normalize_text(s):
+    if s.isascii() and '&' not in s:
+        # REPLACE_MAP is non-ASCII characters and entities, so there's
+        # nothing to replace
+        return s
     for p, r in REPLACE_MAP.items():
         s = s.replace(p, r)
     return s
 
 
+@lru_cache(maxsize=TEXT_CACHE_SIZE)
+def clean_short_text(s):
+    return sys.intern(normalize_text(s.strip()))
+
+
+def clean_text(e):
+    s = e.text or ''
+    if len(s) <= SHORT_TEXT:
+        return clean_short_text(s)
+    return normalize_text(s.strip())
+
+
+def shape_datetime(s):
+    """
+        The datetime for s if it has one of the DATE_SHAPES, without going
+        through strptime, or None if it doesn't or doesn't hold a valid date.
+    """
+    m = DATE_SHAPE.match(s)
+    if m is None:
+        return None
+    fields, groups = SHAPE_FIELDS[m.lastindex]
+    values = dict(zip(fields, m.group(*groups)))
+
+    if 'Y' in values:
+        year = int(values['Y'])
+    else:
+        # strptime's %y pivot
+        year = int(values['y'])
+        year += 2000 if year <= 68 else 1900
+
+    hour = minute = second = 0
+    if 'I' in values:
+        hour = int(values['I'])
+        if not 1 <= hour <= 12:
+            return None
+        hour %= 12
+        if values['p'].lower() == 'pm':
+            hour += 12
+        minute = int(values['M'])
+        second = int(values['S'])
+
+    try:
+        return datetime(year, int(values['m']), int(values['d']), hour,
+                        minute, second)
+    except ValueError:
+        return None
+
+
+def strptime_datetime(s):
+    for f in DATE_FORMATS:
+        try:
+            parsed = datetime.strptime(s, f).isoformat(sep=' ')
+        except ValueError:
+            continue
+        else:
+            return parsed
+    else:
+        return s
+
+
+def strptime_date(s):
+    for f in DATE_FORMATS:
+        try:
+            parsed = datetime.strptime(s, f).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+        else:
+            return parsed
+    else:
+        for p in LEAP_DAY_CHECKS:
+            m = p.match(s)
+            if m is not None:
+                groups = m.groupdict()
+                adjusted = datetime(year=int(groups['year']),
+                                    month=int(groups['month']),
+                                    day=28)
+                return adjusted.strftime('%Y-%m-%d')
+        return s
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def datetime_from_string(s):
+    parsed = shape_datetime(s)
+    if parsed is None:
+        # anything unusual goes through strptime, as it always has
+        return strptime_datetime(s)
+    return parsed.isoformat(sep=' ')
+
+
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def date_from_string(s):
+    parsed = shape_datetime(s)
+    if parsed is None:
+        # anything unusual, and Feb 29ths of non-leap years, go through
+        # strptime and the leap day checks, as they always have
+        return strptime_date(s)
+    return parsed.strftime('%Y-%m-%d')
+
+
 def parse_datetime(e):
     s = clean_text(e)
-    parsed = None
     if s:
-        f = 0
-        for f in DATE_FORMATS:
-            try:
-                parsed = datetime.strptime(s, f).isoformat(sep=' ')
-            except ValueError:
-                continue
-            else:
-                return parsed
-        else:
-            return s
+        return datetime_from_string(s)
     else:
         return None
 
 
 def parse_date(e):
     s = clean_text(e)
-    parsed = None
     if s:
-        f = 0
-        for f in DATE_FORMATS:
-            try:
-                parsed = datetime.strptime(s, f).strftime('%Y-%m-%d')
-            except ValueError:
-                continue
-            else:
-                return parsed
-        else:
-            for p in LEAP_DAY_CHECKS:
-                m = p.match(s)
-                if m is not None:
-                    groups = m.groupdict()
-                    adjusted = datetime(year=int(groups['year']),
-                                        month=int(groups['month']),
-                                        day=28)
-                    return adjusted.strftime('%Y-%m-%d')
-            return s
+        return date_from_string(s)
     else:
         return None
 
 
 def tail_text(e):
-    s = e.tail
-    for p, r in REPLACE_MAP.iteritems():
-        s = s.replace(p, r)
-    return s.strip()
+    s = e.tail or ''
+    return normalize_text(s).strip()
+
+
+def us_number(s):
+    """
+        Parse a US formatted amount like 1,234.50, $1,234, (1,234.50) or
+        12.5%, without going through the process-wide locale. Parentheses
+        make it negative; a percent sign is dropped, not applied.
+    """
+    negative = s[:1] == '(' and s[-1:] == ')'
+    if negative:
+        s = s[1:-1]
+    if ',' in s or '$' in s or '%' in s:
+        s = s.replace(',', '').replace('$', '').replace('%', '')
+    value = float(s)
+    return -value if negative else value
 
 
 def parse_decimal(e):
     s = clean_text(e)
     if s:
-        return locale.atof(s)
+        return us_number(s)
     else:
         return None
 
@@ -140,7 +256,7 @@ def parse_int(e):
 def parse_percent(e):
     s = clean_text(e).replace('%', '')
     if s:
-        return float(s) / 100.0
+        return us_number(s) / 100.0
     else:
         return None
 
@@ -0,0 +1,146 @@
+"""
+    Validation of parsed forms.
+
+    Validators are reused: ``validator_for`` keeps one per schema in every
+    thread (they hold state while validating, so threads can't share them).
+
+    ``FormValidation`` is a validation stage for runs that don't need to
+    fail fast: forms are validated in batches on a process pool (validation
+    is pure Python, so threads would take turns) while parsing carries on,
+    failures are collected instead of raised, and the time spent on each
+    schema is kept, all for a report at the end of the run.
+"""
+import json
+import time
+import threading
+
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import pupa.utils
+
+from validictory import ValidationError
+
+
+_validators = threading.local()
+
+
+def validator_for(schema):
+    validators = getattr(_validators, 'by_schema', None)
+    if validators is None:
+        validators = _validators.by_schema = {}
+    validator = validators.get(schema['title'])
+    if validator is None:
+        validator = validators[schema['title']] = \
+            pupa.utils.DatetimeValidator(required_by_default=False)
+    return validator
+
+
+def validate_form(form):
+    try:
+        validator_for(form.schema).validate(form.as_dict(), form.schema)
+    except ValidationError as ve:
+        raise ValidationError('validation of {} {} failed: {}'.format(
+            form.__class__.__name__, form._form_jurisdiction, ve)
+        )
+
+
+ValidationFailure = namedtuple('ValidationFailure', ['schema', 'document_id',
+                                                     'error'])
+
+
+def validate_forms(forms):
+    """
+        Validate a batch of forms, returning ``(schema title, document id,
+        seconds, error or None)`` for each.
+
+        Module level so it can run in FormValidation's worker processes.
+    """
+    results = []
+    for form in forms:
+        start = time.time()
+        try:
+            validate_form(form)
+            error = None
+        except ValueError as ve:
+            error = str(ve)
+        results.append((form.schema['title'], form._id, time.time() - start,
+                        error))
+    return results
+
+
+class SchemaTiming(object):
+
+    def __init__(self):
+        self.forms = 0
+        self.failed = 0
+        self.seconds = 0.0
+
+
+class FormValidation(object):
+
+    # forms sent to a worker process at a time
+    batch_size = 200
+
+    def __init__(self, workers=2):
+        self._pool = ProcessPoolExecutor(max_workers=workers)
+        self._lock = threading.Lock()
+        self._batch = []
+        self._futures = []
+        self.failures = []
+        self.timings = {}
+
+    def submit(self, form):
+        self._batch.append(form)
+        if len(self._batch) >= self.batch_size:
+            self._submit_batch()
+
+    def _submit_batch(self):
+        future = self._pool.submit(validate_forms, self._batch)
+        future.add_done_callback(self._record)
+        self._futures.append(future)
+        self._batch = []
+        # drop the ones that are done so a long run doesn't pile them up,
+        # keeping any that failed for finish() to raise
+        if len(self._futures) >= 100:
+            self._futures = [f for f in self._futures
+                             if not f.done() or f.exception() is not None]
+
+    def _record(self, future):
+        if future.exception() is not None:
+            # raised again by finish()
+            return
+        with self._lock:
+            for title, document_id, seconds, error in future.result():
+                timing = self.timings.setdefault(title, SchemaTiming())
+                timing.forms += 1
+                timing.seconds += seconds
+                if error is not None:
+                    timing.failed += 1
+                    self.failures.append(ValidationFailure(title, document_id,
+                                                           error))
+
+    def finish(self):
+        """
+            Wait for every submitted form to be validated.
+        """
+        if self._batch:
+            self._submit_batch()
+        try:
+            for future in self._futures:
+                future.result()
+        finally:
+            self._futures = []
+            self._pool.shutdown(wait=True)
+
+    def report(self):
+        return {
+            'failures': [f._asdict() for f in self.failures],
+            'schemas': {title: {'forms': t.forms, 'failed': t.failed,
+                                'seconds': round(t.seconds, 3)}
+                        for title, t in sorted(self.timings.items())},
+        }
+
+    def write_report(self, filename):
+        with open(filename, 'w') as f:
+            json.dump(self.report(), f, indent=2, sort_keys=True)
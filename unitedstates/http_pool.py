@@ -0,0 +1,136 @@
+"""
+    Shared HTTP plumbing for the scrapers.
+
+    Scrapers pool their connections through the sessions module, and
+    scrapers of big bulk files can also make conditional requests, so files
+    that haven't changed since the last run aren't downloaded or parsed
+    again.
+"""
+import os
+import threading
+
+from collections import defaultdict
+from datetime import datetime
+
+from pupa import settings
+from pupa.scrape.base import ScrapeError
+
+from .cache import ValidatorStore, truthy
+from .sessions import POOL_SIZE, RETRIES, pool_session
+
+
+class PooledSessionMixin(object):
+    """
+        Pools the connections of a scrapelib based scraper.
+
+        scrapelib already retries failed requests itself (``retry_attempts``),
+        so the adapter underneath only adds retries when that is turned off.
+    """
+    pool_size = POOL_SIZE
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool_connections()
+
+    def pool_connections(self, pool_size=None):
+        retries = 0 if getattr(self, 'retry_attempts', 0) else RETRIES
+        pool_session(self, pool_size=pool_size or self.pool_size,
+                     retries=retries)
+
+    def log_host_stats(self):
+        for line in self.host_stats.summary():
+            self.info(line)
+
+    def do_scrape(self, *args, **kwargs):
+        try:
+            return super().do_scrape(*args, **kwargs)
+        finally:
+            self.log_host_stats()
+
+
+class ConditionalGetMixin(object):
+    """
+        Lets a scraper skip sources that haven't changed since its last run.
+
+        ``retrieve_if_modified`` sends the validators saved with the last
+        download of a URL. If the server answers 304 the source is skipped,
+        or with ``replay=true`` on the command line, the copy saved last time
+        is used again. A run that skipped every source succeeds rather than
+        failing for returning no objects.
+
+        The validators of a new download are only saved once the whole
+        scrape has succeeded, so a run that fails after downloading gets
+        the source again next time instead of a 304.
+    """
+    validator_db = os.path.join(settings.CACHE_DIR, 'validators.sqlite3')
+    replay_unchanged = False
+    # downloads are written to disk this much at a time
+    download_chunk_bytes = 1024 * 1024
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.validators = ValidatorStore(self.validator_db)
+        self._sources_lock = threading.Lock()
+        self.sources_changed = 0
+        self.sources_unchanged = 0
+        self._pending_validators = []
+
+    def retrieve_if_modified(self, url, filename):
+        """
+            Download ``url`` to ``filename`` unless the copy already there is
+            current. Returns ``(filename, response)``, with None for the
+            response if the source is unchanged and is being skipped.
+
+            The body is streamed to a temporary file in chunks and only
+            replaces ``filename`` once it's complete, so however big the
+            source is it's never held in memory, and the response's content
+            is not available.
+        """
+        response = self.get(url, headers=self.validators.headers(url,
+                                                                 filename),
+                            stream=True)
+
+        if response.status_code == 304:
+            response.close()
+            with self._sources_lock:
+                self.sources_unchanged += 1
+            self.info('{u} unchanged since last download'.format(u=url))
+            return filename, (response if self.replay_unchanged else None)
+
+        part_filename = filename + '.part'
+        try:
+            with open(part_filename, 'wb') as f:
+                for chunk in response.iter_content(self.download_chunk_bytes):
+                    f.write(chunk)
+        finally:
+            response.close()
+        os.replace(part_filename, filename)
+        with self._sources_lock:
+            self.sources_changed += 1
+            self._pending_validators.append((url, dict(response.headers),
+                                             filename))
+        return filename, response
+
+    def save_validators(self):
+        with self._sources_lock:
+            pending, self._pending_validators = self._pending_validators, []
+        for url, headers, filename in pending:
+            self.validators.add(url, headers, filename)
+
+    def do_scrape(self, **kwargs):
+        self.replay_unchanged = truthy(kwargs.pop('replay',
+                                                  self.replay_unchanged))
+        self.sources_changed = 0
+        self.sources_unchanged = 0
+        self._pending_validators = []
+        try:
+            record = super().do_scrape(**kwargs)
+        except ScrapeError:
+            if self.sources_changed or not self.sources_unchanged:
+                raise
+            self.info('no sources changed, nothing to scrape')
+            now = datetime.utcnow()
+            return {'objects': defaultdict(int), 'start': now, 'end': now,
+                    'skipped': 0}
+        self.save_validators()
+        return record
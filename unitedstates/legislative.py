@@ -1,14 +1,153 @@
 from pupa.scrape import Scraper, Person, Membership, Organization, Post
 from pupa.utils import make_pseudo_id
 
-from collections import defaultdict
-import yaml
+from pupa import settings
+
+from collections import defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import os
 import sys
 
-class UnitedStatesLegislativeScraper(Scraper):       
-    def yamlize(self, url):
-        f, resp = self.urlretrieve(url)
-        return yaml.safe_load(resp.content)
+from .cache import load_yaml
+from .http_pool import ConditionalGetMixin, PooledSessionMixin
+from .pipeline import ordered_pipeline
+
+# a post a membership belongs to; the post itself is only made once the
+# shards are merged, so there is one per division_id across all of them
+PostRef = namedtuple('PostRef', ['division_id', 'organization_id', 'label',
+                                 'role'])
+
+
+def load_legislators(cache_dir, filename):
+    return load_yaml(filename, cache_dir)
+
+
+def convert_people(people, source, house_id, senate_id):
+    """
+        Convert a shard of congress-legislators people to Person and
+        Membership objects, in order. Memberships of posts come back as
+        (PostRef, Membership) pairs, with the post_id filled in by the merge.
+    """
+    converted = []
+    person_cache = defaultdict(lambda: defaultdict(lambda: None))
+
+    for person in people:
+        name = person['name'].get('official_full')
+        if name is None:
+            name = "{name[first]} {name[last]}".format(**person)
+
+        birth_date = person['bio'].get('birthday', '')
+
+        who = person_cache[name][birth_date]
+        has_term = False
+
+        if who is None:
+            who = Person(name=name, birth_date=birth_date)
+            who.add_source(url=source,
+                           note="unitedstates project on GitHub")
+
+        for term in person.get('terms', []):
+            has_term = True
+            start_date = term['start']
+            end_date = term['end']
+            state = term['state']
+            type_ = term['type']
+            district = term.get('district', None)
+            party = term.get('party', None)
+
+            organization_id = {'rep': house_id,
+                               'sen': senate_id,}[type_]
+
+            role = {'rep': 'Representative',
+                    'sen': 'Senator',}[type_]
+
+            if type_ == "rep" and district is not None:
+                label = "%s for District %s in %s" % (role, district, state)
+
+                if district == 0:
+                    division_id = (
+                        "ocd-division/country:us/state:{state}".format(
+                            state=state.lower()))
+                else:
+                    division_id = ("ocd-division/country:us/"
+                                   "state:{state}/cd:{district}".format(
+                                       state=state.lower(),
+                                       district=district))
+
+                membership = Membership(
+                    post_id=None,
+                    role=role,
+                    label=label,
+                    start_date=start_date,
+                    end_date=end_date,
+                    person_id=who._id,
+                    organization_id=organization_id)
+                converted.append((PostRef(division_id, organization_id,
+                                          label, role), membership))
+
+            if type_ == "sen":
+
+                division_id = ("ocd-division/country:us/state:{state}".format(
+                    state=state.lower()))
+
+                label = "Senitor for %s" % (state)
+
+                membership = Membership(
+                    post_id=None,
+                    role=role,
+                    label=label,
+                    start_date=start_date,
+                    end_date=end_date,
+                    person_id=who._id,
+                    organization_id=organization_id)
+                converted.append((PostRef(division_id, organization_id,
+                                          label, role), membership))
+
+            if party == "Democrat":
+                party = "Democratic"
+
+            if party:
+                membership = Membership(
+                    role='member',
+                    start_date=start_date,
+                    end_date=end_date,
+                    person_id=who._id,
+                    organization_id=make_pseudo_id(
+                        classification="party",
+                        name=party))
+                converted.append(membership)
+
+        for key, value in person.get('id', {}).items():
+            if isinstance(value, list):
+                for v in value:
+                    who.add_identifier(str(v), scheme=key)
+            else:
+                who.add_identifier(str(value), scheme=key)
+
+        if has_term:
+            converted.append(who)
+
+    return converted
+
+
+class UnitedStatesLegislativeScraper(ConditionalGetMixin, PooledSessionMixin,
+                                     Scraper):
+    # both repos are fetched and parsed at once, then their people are
+    # converted in shards of shard_size on convert_workers processes (None
+    # means one per CPU, 0 converts in this process)
+    fetch_workers = 2
+    parse_workers = None
+    convert_workers = None
+    shard_size = 500
+
+    def fetch_legislators(self, url):
+        # None when the file hasn't changed since the last run
+        filename = os.path.join(settings.CACHE_DIR, os.path.basename(url))
+        f, resp = self.retrieve_if_modified(url, filename)
+        if resp is None:
+            return None
+        return f
 
     def get_url(self, what):
         return ("https://raw.githubusercontent.com/"
@@ -35,138 +174,68 @@ class UnitedStatesLegislativeScraper(Scraper):
         self.senate = senate
         yield senate
 
-    def scrape_current_legislators(self, repos):
-        for repo in repos:
-            CURRENT_LEGISLATORS = self.get_url(repo)
-
-            people = self.yamlize(CURRENT_LEGISLATORS)
-            parties = set()
-            posts = {}
-            person_cache = defaultdict(lambda: defaultdict(lambda: None))
-
-            for person in people:
-                name = person['name'].get('official_full')
-                if name is None:
-                    name = "{name[first]} {name[last]}".format(**person)
-
-                if 'birthday' in person['bio']:
-                    birth_date = person['bio']['birthday']
-
-                who = person_cache[name][birth_date]
-                has_term = False
-
-                if who is None:
-                    who = Person(name=name, birth_date=birth_date)
-                    who.add_source(url=CURRENT_LEGISLATORS,
-                                   note="unitedstates project on GitHub")
-
-                for term in person.get('terms', []):
-                    has_term = True
-                    start_date = term['start']
-                    end_date = term['end']
-                    state = term['state']
-                    type_ = term['type']
-                    district = term.get('district', None)
-                    party = term.get('party', None)
-
-                    chamber = {'rep': 'lower',
-                               'sen': 'upper',}[type_]
-
-                    role = {'rep': 'Representative',
-                            'sen': 'Senator',}[type_]
-
-                    if type_ == "rep" and district is not None:
-                        label = "%s for District %s in %s" % (role, district, state)
-
-                        if district == 0:
-                            division_id = (
-                                "ocd-division/country:us/state:{state}".format(
-                                    state=state.lower()))
-                        else:
-                            division_id = ("ocd-division/country:us/"
-                                           "state:{state}/cd:{district}".format(
-                                               state=state.lower(),
-                                               district=district))
-
-                        post = posts.get(division_id)
-                        if post is None:
-                            post = Post(organization_id={
-                                    "rep": self.house,
-                                    "sen": self.senate
-                                }[type_]._id,
-                                division_id=division_id,
-                                label=label, role=role)
-                            posts[division_id] = post
-                            yield post
-
-                        membership = Membership(
-                            post_id=post._id,
-                            role=role,
-                            label=label,
-                            start_date=start_date,
-                            end_date=end_date,
-                            person_id=who._id,
-                            organization_id={
-                                "rep": self.house,
-                                "sen": self.senate,
-                            }[type_]._id)
-                        yield membership
-
-                    if type_ == "sen":
-
-                        division_id = ("ocd-division/country:us/state:{state}".format(
-                            state=state.lower()))
+    def scrape_current_legislators(self, repos, fetch_workers=None,
+                                   parse_workers=None, convert_workers=None):
+        if convert_workers is None:
+            convert_workers = self.convert_workers
+        convert_pool = ProcessPoolExecutor(max_workers=convert_workers) \
+            if convert_workers != 0 else None
+
+        legislators = ordered_pipeline(
+            [self.get_url(repo) for repo in repos],
+            self.fetch_legislators,
+            partial(load_legislators, os.path.join(settings.CACHE_DIR, 'yaml')),
+            fetch_workers=fetch_workers or self.fetch_workers,
+            parse_workers=parse_workers if parse_workers is not None
+            else self.parse_workers,
+            max_pending=len(repos)
+        )
 
-                        label = "Senitor for %s" % (state)
-
-                        post = posts.get(division_id)
-                        if post is None:
-                            post = Post(organization_id={
-                                    "rep": self.house,
-                                    "sen": self.senate
-                                }[type_]._id,
-                                division_id=division_id,
-                                label=label, role=role)
-                            posts[division_id] = post
-                            yield post
-
-                        membership = Membership(
-                            post_id=post._id,
-                            role=role,
-                            label=label,
-                            start_date=start_date,
-                            end_date=end_date,
-                            person_id=who._id,
-                            organization_id={
-                                "rep": self.house,
-                                "sen": self.senate,
-                            }[type_]._id)
-                        yield membership
-
-                    if party == "Democrat":
-                        party = "Democratic"
-
-                    if party:
-                        membership = Membership(
-                            role='member',
-                            start_date=start_date,
-                            end_date=end_date,
-                            person_id=who._id,
-                            organization_id=make_pseudo_id(
-                                classification="party",
-                                name=party))
-                        yield membership
-
-                for key, value in person.get('id', {}).items():
-                    if isinstance(value, list):
-                        for v in value:
-                            who.add_identifier(str(v), scheme=key)
-                    else:
-                        who.add_identifier(str(value), scheme=key)
-
-                if has_term:
-                    yield who
-
-    def scrape(self):
+        try:
+            for url, filename, people in legislators:
+                if filename is None:
+                    continue
+                shards = [people[i:i + self.shard_size]
+                          for i in range(0, len(people), self.shard_size)]
+                convert = partial(convert_people, source=url,
+                                  house_id=self.house._id,
+                                  senate_id=self.senate._id)
+                converted = convert_pool.map(convert, shards) \
+                    if convert_pool is not None else map(convert, shards)
+                yield from self.merge_posts(converted)
+        finally:
+            if convert_pool is not None:
+                convert_pool.shutdown(wait=True)
+
+    def merge_posts(self, shards):
+        """
+            Yield the converted shards in order, making one post per
+            division_id, just before the first membership of it.
+        """
+        posts = {}
+        for converted in shards:
+            for obj in converted:
+                if isinstance(obj, tuple):
+                    ref, membership = obj
+                    post = posts.get(ref.division_id)
+                    if post is None:
+                        post = Post(organization_id=ref.organization_id,
+                                    division_id=ref.division_id,
+                                    label=ref.label, role=ref.role)
+                        posts[ref.division_id] = post
+                        yield post
+                    membership.post_id = post._id
+                    yield membership
+                else:
+                    yield obj
+
+    def scrape(self, fetch_workers=None, parse_workers=None,
+               convert_workers=None):
         yield from self.scrape_current_chambers()
-        yield from self.scrape_current_legislators(['legislators-current','legislators-historical'])
+        yield from self.scrape_current_legislators(
+            ['legislators-current','legislators-historical'],
+            fetch_workers=int(fetch_workers) if fetch_workers else None,
+            parse_workers=int(parse_workers)
+            if parse_workers is not None else None,
+            convert_workers=int(convert_workers)
+            if convert_workers is not None else None)
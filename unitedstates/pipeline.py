@@ -0,0 +1,114 @@
+"""
+    Bounded, order-preserving fetch/parse pipeline for the disclosure
+    scrapers.
+
+    Items are fetched on a thread pool, parsed on a process pool and handed
+    back to the caller in the order they went in, so transforming and
+    yielding stays in the scraper's own thread. At most ``max_pending`` items
+    are in flight at once and the input iterable is only advanced as slots
+    free up, so memory stays flat however many items are queued.
+"""
+import time
+import threading
+
+from collections import deque, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from urllib.parse import urlparse
+
+
+# returned by a fetch function that already has the parse result, e.g. from
+# an earlier run, to send an item straight through without parsing it
+Parsed = namedtuple('Parsed', ['fetched', 'parsed'])
+
+
+class HostRateLimiter(object):
+    """
+        Spaces out requests to the same host across all threads.
+    """
+
+    def __init__(self, requests_per_second=None):
+        self.interval = 1.0 / requests_per_second if requests_per_second \
+            else 0
+        self._lock = threading.Lock()
+        self._next_slot = {}
+
+    def wait(self, url):
+        if not self.interval:
+            return
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def _chain_parse(fetch_future, parse, parse_pool, result):
+    """
+        Once ``fetch_future`` finishes, parse what it fetched and put
+        ``(fetched, parsed)`` on ``result``.
+    """
+
+    def parsed(parse_future):
+        try:
+            result.set_result((fetched, parse_future.result()))
+        except BaseException as e:
+            result.set_exception(e)
+
+    try:
+        fetched = fetch_future.result()
+        if fetched is None:
+            result.set_result((None, None))
+        elif isinstance(fetched, Parsed):
+            result.set_result(tuple(fetched))
+        elif parse_pool is None:
+            result.set_result((fetched, parse(fetched)))
+        else:
+            parse_pool.submit(parse, fetched).add_done_callback(parsed)
+    except BaseException as e:
+        result.set_exception(e)
+
+
+def ordered_pipeline(items, fetch, parse, fetch_workers=4, parse_workers=None,
+                     max_pending=32):
+    """
+        Yield ``(item, fetched, parsed)`` for every item, in input order.
+
+        ``fetch(item)`` runs on a pool of ``fetch_workers`` threads and may
+        return None to skip parsing, or a ``Parsed`` to supply the parse
+        result itself. ``parse(fetched)`` runs on a pool of
+        ``parse_workers`` processes (None means one per CPU, 0 parses on the
+        fetch threads instead), so it and its argument must be picklable.
+        Exceptions are re-raised when their item's turn comes up.
+    """
+    items = iter(items)
+    pending = deque()
+
+    fetch_pool = ThreadPoolExecutor(max_workers=fetch_workers)
+    parse_pool = ProcessPoolExecutor(max_workers=parse_workers) \
+        if parse_workers != 0 else None
+
+    def submit(item):
+        result = Future()
+        fetch_pool.submit(fetch, item).add_done_callback(
+            lambda f: _chain_parse(f, parse, parse_pool, result))
+        pending.append((item, result))
+
+    try:
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < max_pending:
+                try:
+                    submit(next(items))
+                except StopIteration:
+                    exhausted = True
+            if not pending:
+                break
+            item, result = pending.popleft()
+            fetched, parsed = result.result()
+            yield item, fetched, parsed
+    finally:
+        fetch_pool.shutdown(wait=True)
+        if parse_pool is not None:
+            parse_pool.shutdown(wait=True)
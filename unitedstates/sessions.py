@@ -0,0 +1,100 @@
+"""
+    Pooled, instrumented ``requests`` sessions.
+
+    Every session goes through a keep-alive adapter that asks for gzip,
+    retries failed connections and 5xx responses with exponential backoff,
+    and keeps per-host request, latency and byte counts.
+
+    Nothing here imports from the rest of the package, so scripts can load
+    this file on its own, without pulling in the scrapers and pupa.
+"""
+import threading
+
+from collections import defaultdict
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+POOL_SIZE = 10
+RETRIES = 3
+BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+class HostStats(object):
+    """
+        Thread-safe per-host counters of requests made, seconds spent waiting
+        for response headers and body bytes received.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = defaultdict(int)
+        self.seconds = defaultdict(float)
+        self.bytes = defaultdict(int)
+
+    def record(self, host, seconds, nbytes):
+        with self._lock:
+            self.requests[host] += 1
+            self.seconds[host] += seconds
+            self.bytes[host] += nbytes
+
+    def hook(self, response, *args, **kwargs):
+        """
+            A requests response hook recording each response it sees.
+        """
+        if kwargs.get('stream'):
+            nbytes = int(response.headers.get('Content-Length', 0))
+        else:
+            # requests reads the body right after the hooks anyway
+            nbytes = len(response.content)
+        self.record(urlparse(response.url).netloc,
+                    response.elapsed.total_seconds(), nbytes)
+
+    def summary(self):
+        """
+            One line per host, busiest first.
+        """
+        with self._lock:
+            hosts = sorted(self.requests, key=self.requests.get, reverse=True)
+            return ['{h}: {n} requests, {l:.1f}ms mean latency, {b} bytes'
+                    .format(h=host, n=self.requests[host],
+                            l=1000 * self.seconds[host] / self.requests[host],
+                            b=self.bytes[host])
+                    for host in hosts]
+
+
+def pool_session(session, pool_size=POOL_SIZE, retries=RETRIES,
+                 backoff_factor=BACKOFF_FACTOR, stats=None):
+    """
+        Mount a pooled adapter on ``session`` for http and https, and start
+        counting its requests in ``stats`` (a new ``HostStats`` if None),
+        available afterwards as ``session.host_stats``.
+
+        ``pool_size`` is the number of connections kept open per host, and
+        should be at least the number of threads sharing the session.
+    """
+    retry = Retry(total=retries, backoff_factor=backoff_factor,
+                  status_forcelist=RETRY_STATUSES, raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                          max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['Accept-Encoding'] = 'gzip, deflate'
+
+    if stats is None:
+        stats = getattr(session, 'host_stats', None) or HostStats()
+    if getattr(session, 'host_stats', None) is not stats:
+        session.hooks['response'].append(stats.hook)
+        session.host_stats = stats
+    return session
+
+
+def pooled_session(**kwargs):
+    """
+        A new ``requests.Session`` set up by ``pool_session``.
+    """
+    return pool_session(requests.Session(), **kwargs)